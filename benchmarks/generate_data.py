@@ -0,0 +1,185 @@
+# benchmarks/generate_data.py
+"""Generator syntetycznych danych TERYT (TERC, SIMC, ULIC) oraz pliku kodów pocztowych.
+
+Pliki mają ten sam układ kolumn i separator co pliki adresowe GUS, więc mogą być
+podane aplikacji przez DATA_DIR zamiast prawdziwych danych. Przy scale=1.0 liczności
+są zbliżone do prawdziwych (~4,2 tys. wierszy TERC, ~100 tys. SIMC, ~300 tys. ULIC),
+a rozkład jest celowo skośny: kilka bardzo dużych miast z tysiącami ulic i dziesiątkami
+kodów pocztowych przypisanych do ulic, dużo małych wsi bez ulic oraz kody pocztowe
+obejmujące wiele miejscowości.
+
+Przykład:
+    python benchmarks/generate_data.py --output-dir ./bench_data --scale 1.0 --seed 42
+"""
+import argparse
+import csv
+import os
+import random
+from typing import Dict, List
+
+STAN_NA = '2025-07-30'
+
+WOJ_NAZWY = [
+    'DOLNOŚLĄSKIE', 'KUJAWSKO-POMORSKIE', 'LUBELSKIE', 'LUBUSKIE', 'ŁÓDZKIE', 'MAŁOPOLSKIE',
+    'MAZOWIECKIE', 'OPOLSKIE', 'PODKARPACKIE', 'PODLASKIE', 'POMORSKIE', 'ŚLĄSKIE',
+    'ŚWIĘTOKRZYSKIE', 'WARMIŃSKO-MAZURSKIE', 'WIELKOPOLSKIE', 'ZACHODNIOPOMORSKIE',
+]
+
+CECHY = ['ul.', 'ul.', 'ul.', 'ul.', 'al.', 'pl.', 'os.', 'rondo']
+IMIONA = ['Jana', 'Adama', 'Marii', 'Józefa', 'Tadeusza', 'Stefana', 'Kazimierza', 'Heleny']
+SYLABY = ['bor', 'wol', 'lip', 'dąb', 'brzez', 'sos', 'kamień', 'grab', 'mił', 'rad', 'zał', 'kraw']
+KONCOWKI = ['owo', 'ice', 'ów', 'ka', 'no', 'in', 'ce', 'iszki', 'owa', 'ek']
+
+TERC_COLS = ['WOJ', 'POW', 'GMI', 'RODZ', 'NAZWA', 'NAZWA_DOD', 'STAN_NA']
+SIMC_COLS = ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'RM', 'MZ', 'NAZWA', 'SYM', 'SYMPOD', 'STAN_NA']
+ULIC_COLS = ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'SYM', 'SYM_UL', 'CECHA', 'NAZWA_1', 'NAZWA_2', 'STAN_NA']
+KODY_COLS = ['PNA', 'MIEJSCOWOŚĆ', 'ULICA', 'NUMERY', 'GMINA', 'POWIAT', 'WOJEWÓDZTWO']
+
+
+def _nazwa(rng: random.Random, uzyte: set) -> str:
+    """Losuje unikalną, polsko brzmiącą nazwę."""
+    while True:
+        nazwa = ''.join(rng.choice(SYLABY) for _ in range(rng.randint(1, 2))) + rng.choice(KONCOWKI)
+        nazwa = nazwa.capitalize()
+        if nazwa not in uzyte:
+            uzyte.add(nazwa)
+            return nazwa
+
+
+def _ulice(rng: random.Random, liczba: int) -> List[Dict[str, str]]:
+    """Losuje listę ulic (CECHA, NAZWA_1, NAZWA_2) o unikalnych pełnych nazwach."""
+    ulice, pelne_nazwy = [], set()
+    while len(ulice) < liczba:
+        nazwa_1 = ''.join(rng.choice(SYLABY) for _ in range(rng.randint(1, 3))).capitalize() + rng.choice(['owa', 'na', 'ska', 'cka'])
+        nazwa_2 = rng.choice(IMIONA) if rng.random() < 0.2 else ''
+        pelna = f"{nazwa_2} {nazwa_1}".strip()
+        if pelna in pelne_nazwy:
+            continue
+        pelne_nazwy.add(pelna)
+        ulice.append({'CECHA': rng.choice(CECHY), 'NAZWA_1': nazwa_1, 'NAZWA_2': nazwa_2})
+    return ulice
+
+
+def generate(output_dir: str, scale: float = 1.0, seed: int = 42) -> Dict[str, int]:
+    """Generuje pliki TERC/SIMC/ULIC/kody_pocztowe w katalogu output_dir.
+
+    Args:
+        output_dir: Katalog docelowy (zostanie utworzony, jeśli nie istnieje)
+        scale: Mnożnik liczby powiatów, gmin i miejscowości (1.0 ~ rząd wielkości prawdziwych danych)
+        seed: Ziarno generatora liczb losowych, aby dane były powtarzalne
+
+    Returns:
+        Słownik z liczbą wierszy w każdym wygenerowanym pliku.
+    """
+    rng = random.Random(seed)
+    terc, simc, ulic, kody = [], [], [], []
+    next_sym = 100000
+    next_sym_ul = 10000
+    next_pna = 0
+
+    def nowy_pna() -> str:
+        nonlocal next_pna
+        next_pna += 1
+        numer = next_pna % 100000 # Przy bardzo dużym scale kody zaczynają się powtarzać
+        return f"{numer // 1000:02d}-{numer % 1000:03d}"
+
+    powiaty_na_woj = max(1, round(19 * scale))
+    gminy_na_pow = max(1, round(8 * scale))
+    duze_miasta = {rng.randrange(len(WOJ_NAZWY)) for _ in range(max(1, round(6 * scale)))}
+
+    for woj_idx, woj_nazwa in enumerate(WOJ_NAZWY):
+        woj = f"{(woj_idx + 1) * 2:02d}"
+        terc.append({'WOJ': woj, 'NAZWA': woj_nazwa, 'NAZWA_DOD': 'województwo'})
+
+        # Nazwy muszą być unikalne tylko w obrębie jednostki nadrzędnej - jak w prawdziwych danych
+        nazwy_powiatow: set = set()
+        for pow_idx in range(1, powiaty_na_woj + 1):
+            pow_ = f"{pow_idx:02d}"
+            pow_nazwa = _nazwa(rng, nazwy_powiatow).lower() + 'ski'
+            nazwy_gmin: set = set()
+            duze_miasto = pow_idx == 1 and woj_idx in duze_miasta
+            terc.append({'WOJ': woj, 'POW': pow_, 'NAZWA': pow_nazwa, 'NAZWA_DOD': 'powiat'})
+
+            for gmi_idx in range(1, gminy_na_pow + 1):
+                gmi = f"{gmi_idx:02d}"
+                gmi_nazwa = _nazwa(rng, nazwy_gmin)
+                nazwy_wsi = {gmi_nazwa}
+                if duze_miasto and gmi_idx == 1:
+                    rodzaje = ['1']
+                else:
+                    rodzaje = rng.choices([['2'], ['1'], ['4', '5']], weights=[6, 1, 3])[0]
+                if rodzaje == ['4', '5']:
+                    terc.append({'WOJ': woj, 'POW': pow_, 'GMI': gmi, 'RODZ': '3', 'NAZWA': gmi_nazwa, 'NAZWA_DOD': 'gmina miejsko-wiejska'})
+                for rodz in rodzaje:
+                    terc.append({'WOJ': woj, 'POW': pow_, 'GMI': gmi, 'RODZ': rodz, 'NAZWA': gmi_nazwa,
+                                 'NAZWA_DOD': {'1': 'gmina miejska', '2': 'gmina wiejska', '4': 'miasto', '5': 'obszar wiejski'}[rodz]})
+
+                    if rodz in ('1', '4'):
+                        # Miasto o nazwie gminy; duże miasta dostają tysiące ulic i wiele kodów
+                        miejscowosci = [(gmi_nazwa, '96', rng.randint(3000, 6000) if duze_miasto and gmi_idx == 1 else rng.randint(20, 200))]
+                    else:
+                        # Większość wsi nie ma ulic w ULIC
+                        miejscowosci = [(_nazwa(rng, nazwy_wsi), '01', 0 if rng.random() < 0.85 else rng.randint(3, 20))
+                                        for _ in range(max(1, round(rng.randint(20, 60) * scale)))]
+
+                    kody_wiejskie, wies_w_kodzie = nowy_pna(), 0
+                    for nazwa, rm, liczba_ulic in miejscowosci:
+                        sym = f"{next_sym:07d}"
+                        next_sym += 1
+                        simc.append({'WOJ': woj, 'POW': pow_, 'GMI': gmi, 'RODZ_GMI': rodz, 'RM': rm, 'MZ': '1',
+                                     'NAZWA': nazwa, 'SYM': sym, 'SYMPOD': sym})
+                        ulice = _ulice(rng, liczba_ulic)
+                        for ulica in ulice:
+                            ulic.append({'WOJ': woj, 'POW': pow_, 'GMI': gmi, 'RODZ_GMI': rodz, 'SYM': sym,
+                                         'SYM_UL': f"{next_sym_ul % 100000:05d}", **ulica})
+                            next_sym_ul += 1
+
+                        if rm == '96' and liczba_ulic >= 100:
+                            # Większe miasto: kilka do kilkudziesięciu kodów, każdy dla grupy ulic (wiersz na ulicę)
+                            pna = nowy_pna()
+                            for nr, ulica in enumerate(ulice):
+                                if nr and nr % 100 == 0:
+                                    pna = nowy_pna()
+                                kody.append({'PNA': pna, 'MIEJSCOWOŚĆ': nazwa, 'ULICA': f"{ulica['NAZWA_2']} {ulica['NAZWA_1']}".strip(),
+                                             'NUMERY': rng.choice(['', '1-99', '2-40(p)', '1-25(n)']),
+                                             'GMINA': gmi_nazwa, 'POWIAT': pow_nazwa, 'WOJEWÓDZTWO': woj_nazwa.lower()})
+                        elif rm == '96':
+                            # Małe miasto: jeden kod dla całej miejscowości
+                            kody.append({'PNA': nowy_pna(), 'MIEJSCOWOŚĆ': nazwa, 'ULICA': '', 'NUMERY': '',
+                                         'GMINA': gmi_nazwa, 'POWIAT': pow_nazwa, 'WOJEWÓDZTWO': woj_nazwa.lower()})
+                        else:
+                            # Wsie: jeden kod pocztowy obejmuje wiele miejscowości (nazwa wsi w nawiasie)
+                            if wies_w_kodzie >= rng.randint(4, 30):
+                                kody_wiejskie, wies_w_kodzie = nowy_pna(), 0
+                            wies_w_kodzie += 1
+                            kody.append({'PNA': kody_wiejskie, 'MIEJSCOWOŚĆ': f"{gmi_nazwa} ({nazwa})", 'ULICA': '', 'NUMERY': '',
+                                         'GMINA': gmi_nazwa, 'POWIAT': pow_nazwa, 'WOJEWÓDZTWO': woj_nazwa.lower()})
+
+    os.makedirs(output_dir, exist_ok=True)
+    pliki = {
+        f"TERC_Adresowy_{STAN_NA}.csv": (TERC_COLS, terc),
+        f"SIMC_Adresowy_{STAN_NA}.csv": (SIMC_COLS, simc),
+        f"ULIC_Adresowy_{STAN_NA}.csv": (ULIC_COLS, ulic),
+        'kody_pocztowe.csv': (KODY_COLS, kody),
+    }
+    liczniki = {}
+    for nazwa_pliku, (kolumny, wiersze) in pliki.items():
+        with open(os.path.join(output_dir, nazwa_pliku), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=kolumny, delimiter=';', restval='', extrasaction='ignore')
+            writer.writeheader()
+            for wiersz in wiersze:
+                if 'STAN_NA' in kolumny:
+                    wiersz.setdefault('STAN_NA', STAN_NA)
+                writer.writerow(wiersz)
+        liczniki[nazwa_pliku] = len(wiersze)
+    return liczniki
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generuje syntetyczne pliki TERYT i kodów pocztowych.")
+    parser.add_argument('--output-dir', default='./bench_data', help="Katalog docelowy")
+    parser.add_argument('--scale', type=float, default=1.0, help="Mnożnik rozmiaru danych")
+    parser.add_argument('--seed', type=int, default=42, help="Ziarno generatora liczb losowych")
+    args = parser.parse_args()
+    for nazwa_pliku, liczba in generate(args.output_dir, args.scale, args.seed).items():
+        print(f"{nazwa_pliku}: {liczba} wierszy")
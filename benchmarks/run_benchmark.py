@@ -0,0 +1,330 @@
+# benchmarks/run_benchmark.py
+"""Benchmark API TERYT uruchamiany w jednym procesie, bez serwera HTTP.
+
+Mierzy:
+- czas zimnego startu: import modułu, ładowanie danych w lifespan aplikacji oraz czas do gotowości
+  (/health/ready, czyli razem z rozgrzewaniem w tle) wraz z profilem etapów z /stats/startup,
+- zużycie pamięci (RSS) po starcie i szczytowe RSS całego przebiegu,
+- percentyle opóźnień, przepustowość i trafienia pamięci podręcznej dla każdego endpointu
+  (cache_hit_ratio jest null, gdy testowany commit nie ma pamięci podręcznej odpowiedzi).
+
+Zapytania są wysyłane bezpośrednio do aplikacji ASGI, więc wynik nie zależy od sieci ani
+serwera HTTP. Wyniki (razem z hashem commita) trafiają do pliku JSON, a --compare wypisuje
+różnice względem wcześniejszego pliku, np. z poprzedniego commita.
+
+Przykład:
+    python benchmarks/generate_data.py --output-dir ./bench_data --scale 1.0
+    python benchmarks/run_benchmark.py --data-dir ./bench_data
+    python benchmarks/run_benchmark.py --data-dir ./bench_data --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb() -> Optional[float]:
+    """Bieżące RSS procesu (tylko Linux, z /proc)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    """Szczytowe RSS procesu (ru_maxrss jest w KB na Linuksie i w bajtach na macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+class AsgiClient:
+    """Minimalny klient wywołujący aplikację ASGI bezpośrednio (bez httpx i serwera)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_task = None
+        self._lifespan_queue: Optional[asyncio.Queue] = None
+        self._lifespan_events: Optional[asyncio.Queue] = None
+
+    async def startup(self):
+        self._lifespan_queue, self._lifespan_events = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}}
+        self._lifespan_task = asyncio.ensure_future(self.app(scope, self._lifespan_queue.get, self._lifespan_events.put))
+        await self._lifespan_queue.put({'type': 'lifespan.startup'})
+        message = await self._lifespan_events.get()
+        if message['type'] != 'lifespan.startup.complete':
+            raise RuntimeError(f"Start aplikacji nie powiódł się: {message}")
+
+    async def shutdown(self):
+        await self._lifespan_queue.put({'type': 'lifespan.shutdown'})
+        await self._lifespan_events.get()
+        await self._lifespan_task
+
+    async def get(self, path: str, params: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': quote(path).encode(), 'root_path': '',
+            'query_string': urlencode(params or {}).encode(),
+            'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+            'client': ('127.0.0.1', 50000), 'server': ('benchmark', 80),
+        }
+        request_sent = False
+        response_done = asyncio.Event()
+        status, body = 0, []
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await response_done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                body.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    response_done.set()
+
+        await self.app(scope, receive, send)
+        return status, b''.join(body)
+
+
+def build_workloads(main, requests: int, seed: int) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+    """Losuje zapytania z załadowanych danych; popularność kodów pocztowych ma rozkład Zipfa, jak w ruchu produkcyjnym."""
+    rng = random.Random(seed)
+    kody = main.kody_pocztowe_data
+    pairs = list(kody[['PNA', 'MIEJSCOWOŚĆ_CLEAN']].drop_duplicates().itertuples(index=False, name=None))
+    with_street = kody[kody['ULICA'].fillna('').str.strip() != '']
+    triples = list(with_street[['PNA', 'MIEJSCOWOŚĆ_CLEAN', 'ULICA']].drop_duplicates().itertuples(index=False, name=None))
+    postal_codes = sorted({pc for pc, _ in pairs})
+
+    def zipf_sample(items):
+        items = list(items)
+        rng.shuffle(items)
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(len(items))]
+        return rng.choices(items, weights=weights, k=requests)
+
+    workloads = {
+        "localities": [(f"/postal_codes/{pc}/localities", {}) for pc in zipf_sample(postal_codes)],
+        "details": [(f"/postal_codes/{pc}/details", {"locality": loc}) for pc, loc in zipf_sample(pairs)],
+        "address_locality": [("/lookup/address", {"postal_code": pc, "locality": loc}) for pc, loc in zipf_sample(pairs)],
+    }
+    if triples:
+        workloads["address_street"] = [("/lookup/address", {"postal_code": pc, "locality": loc, "street_name": street.strip()})
+                                       for pc, loc, street in zipf_sample(triples)]
+    return workloads
+
+
+async def wait_until_ready(client: AsgiClient, timeout: float, interval: float = 0.01) -> Optional[Dict[str, Any]]:
+    """Czeka, aż /health/ready zwróci 200 (rozgrzewanie trwa w tle po zakończeniu lifespan).
+
+    Zwraca treść odpowiedzi albo None, gdy testowany commit nie ma tego endpointu (404) - wtedy aplikacja
+    jest gotowa zaraz po starcie.
+    """
+    deadline = time.perf_counter() + timeout
+    while True:
+        status, body = await client.get('/health/ready')
+        if status == 200:
+            return json.loads(body)
+        if status == 404:
+            return None
+        if time.perf_counter() > deadline:
+            raise SystemExit(f"Aplikacja nie zgłosiła gotowości w ciągu {timeout} s (ostatnia odpowiedź {status}: {body[:200]!r}).")
+        await asyncio.sleep(interval)
+
+
+async def fetch_startup_profile(client: AsgiClient) -> Optional[Dict[str, Any]]:
+    """Profil startu z /stats/startup (None dla commitów bez tego endpointu)."""
+    status, body = await client.get('/stats/startup')
+    return json.loads(body) if status == 200 else None
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_workload(client: AsgiClient, main, workload, concurrency: int, headers: Dict[str, str]) -> Dict[str, Any]:
+    """Wykonuje zapytania z ograniczoną współbieżnością i zwraca statystyki opóźnień."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    cache = getattr(main, 'response_cache', None) # Starsze commity nie mają pamięci podręcznej odpowiedzi
+    cache_before = cache.stats() if cache is not None else None
+
+    async def one(path, params):
+        async with semaphore:
+            start = time.perf_counter()
+            status, _ = await client.get(path, params, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(path, params) for path, params in workload))
+    wall = time.perf_counter() - wall_start
+
+    hits = misses = 0
+    if cache is not None:
+        cache_after = cache.stats()
+        hits = cache_after['hits'] - cache_before['hits']
+        misses = cache_after['misses'] - cache_before['misses']
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            **{f"p{q}": round(percentile(latencies, q) * 1000, 3) for q in (50, 90, 95, 99)},
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "status_codes": statuses,
+        "cache_hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "meta": {
+            **git_commit(),
+            "label": args.label,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "data_dir": os.path.abspath(args.data_dir),
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+    }
+    rss_start = rss_mb()
+    import_start = time.perf_counter()
+    import main
+    import pandas as pd
+    import_seconds = time.perf_counter() - import_start
+    results["meta"]["pandas"] = pd.__version__
+
+    client = AsgiClient(main.app)
+    startup_start = time.perf_counter()
+    await client.startup()
+    startup_seconds = time.perf_counter() - startup_start
+    # Pomiary zaczynają się dopiero po rozgrzewaniu - inaczej mierzyłyby zapytania konkurujące z nim o CPU,
+    # a czyszczenie pamięci podręcznej przed scenariuszem ścigałoby się z jej zapełnianiem
+    await wait_until_ready(client, args.ready_timeout)
+    ready_seconds = time.perf_counter() - startup_start
+    if main.kody_pocztowe_data is None or main.ulic_data_enriched is None:
+        raise SystemExit(f"Nie udało się załadować danych z {args.data_dir} - sprawdź pliki i zmienne *_FILENAME.")
+    results["meta"]["dataset_rows"] = {
+        "TERC": len(main.terc_data), "SIMC": len(main.simc_data), "ULIC": len(main.ulic_data), "KODY_POCZTOWE": len(main.kody_pocztowe_data),
+    }
+    results["startup"] = {
+        "import_seconds": round(import_seconds, 3),
+        "load_seconds": round(startup_seconds, 3),
+        "ready_seconds": round(ready_seconds, 3),
+        "rss_before_import_mb": round(rss_start, 1) if rss_start is not None else None,
+        "rss_after_startup_mb": round(rss_mb(), 1) if rss_mb() is not None else None,
+        "peak_rss_after_startup_mb": round(peak_rss_mb(), 1),
+        "profile": await fetch_startup_profile(client),
+    }
+
+    headers = {"Authorization": f"Bearer {main.API_TOKEN}"}
+    workloads = build_workloads(main, args.requests, args.seed)
+    results["endpoints"] = {}
+    cache = getattr(main, 'response_cache', None)
+    for name, workload in workloads.items():
+        if cache is not None:
+            cache.clear() # Każdy scenariusz startuje z pustą pamięcią podręczną
+        results["endpoints"][name] = await run_workload(client, main, workload, args.concurrency, headers)
+        stats = results["endpoints"][name]
+        print(f"{name:18s} {stats['throughput_rps']:>9} rps  p50 {stats['latency_ms']['p50']:>8} ms  p99 {stats['latency_ms']['p99']:>8} ms  statusy {stats['status_codes']}")
+
+    await client.shutdown()
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def flatten(results: Dict[str, Any]) -> Dict[str, float]:
+    """Spłaszcza wyniki do par metryka -> wartość używanych przy porównaniu."""
+    flat = {
+        "startup.load_seconds": results["startup"]["load_seconds"],
+        "startup.ready_seconds": results["startup"].get("ready_seconds"), # Brak w wynikach sprzed pomiaru gotowości
+        "startup.peak_rss_after_startup_mb": results["startup"]["peak_rss_after_startup_mb"],
+        "peak_rss_mb": results["peak_rss_mb"],
+    }
+    for name, stats in results["endpoints"].items():
+        flat[f"{name}.throughput_rps"] = stats["throughput_rps"]
+        for q in ("p50", "p99"):
+            flat[f"{name}.{q}_ms"] = stats["latency_ms"][q]
+    return flat
+
+
+def print_comparison(previous: Dict[str, Any], current: Dict[str, Any]):
+    old, new = flatten(previous), flatten(current)
+    print(f"\nPorównanie z {previous['meta'].get('commit')} ({previous['meta'].get('label') or '-'}):")
+    print(f"{'metryka':40s} {'poprzednio':>12s} {'teraz':>12s} {'zmiana':>9s}")
+    for metric, value in new.items():
+        before = old.get(metric)
+        if before is None or value is None:
+            continue
+        change = f"{(value - before) / before * 100:+.1f}%" if before else "-"
+        print(f"{metric:40s} {before:>12} {value:>12} {change:>9s}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark API TERYT w procesie (ASGI).")
+    parser.add_argument('--data-dir', default='./bench_data', help="Katalog z plikami TERYT i kodów pocztowych (np. z generate_data.py)")
+    parser.add_argument('--requests', type=int, default=500, help="Liczba zapytań na endpoint")
+    parser.add_argument('--concurrency', type=int, default=1, help="Liczba równoległych zapytań")
+    parser.add_argument('--ready-timeout', type=float, default=600, help="Maksymalny czas oczekiwania na gotowość aplikacji (s)")
+    parser.add_argument('--seed', type=int, default=42, help="Ziarno losowania zapytań")
+    parser.add_argument('--label', default=None, help="Opis przebiegu zapisywany w wynikach")
+    parser.add_argument('--output', default=None, help="Plik wyników JSON (domyślnie benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', default=None, help="Plik wyników JSON do porównania")
+    args = parser.parse_args()
+
+    # Konfiguracja aplikacji jest czytana przy imporcie main, więc musi być ustawiona wcześniej
+    os.environ['DATA_DIR'] = args.data_dir
+    os.environ.setdefault('LOG_LEVEL', 'ERROR') # Ostrzeżenia z wyszukiwań zaśmiecałyby wynik
+    sys.path.insert(0, REPO_DIR)
+
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(REPO_DIR, 'benchmarks', 'results', f"{results['meta']['commit'] or 'wynik'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nStart: {results['startup']['load_seconds']} s, gotowość: {results['startup']['ready_seconds']} s, szczytowe RSS: {results['peak_rss_mb']} MB. Wyniki zapisano w {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,13 +1,31 @@
 # main.py
 import os
+import re
+import atexit
+import resource
+import asyncio
+import bisect
+import functools
+import json
+import queue
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+import numpy as np
 import pandas as pd
 from fastapi import FastAPI, HTTPException, Query, Path, Depends, Security
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from pydantic import BaseModel, Field
 import uvicorn # Potrzebne do uruchomienia
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 # --- Konfiguracja ---
 DATA_DIR = os.getenv('DATA_DIR', './dane')
@@ -15,22 +33,170 @@ TERC_FILENAME = os.getenv('TERC_FILENAME', 'TERC_Adresowy_2025-07-30.csv')
 SIMC_FILENAME = os.getenv('SIMC_FILENAME', 'SIMC_Adresowy_2025-07-30.csv')
 ULIC_FILENAME = os.getenv('ULIC_FILENAME', 'ULIC_Adresowy_2025-07-30.csv')
 KODY_POCZTOWE_FILENAME = os.getenv('KODY_POCZTOWE_FILENAME', 'kody_pocztowe.csv')
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '10000')) # 0 wyłącza pamięć podręczną odpowiedzi
+
+# Historyczne wydania TERYT dla zapytań z parametrem 'as_of' (daty RRRR-MM-DD rozdzielone przecinkami)
+HISTORICAL_RELEASES = [d.strip() for d in os.getenv('HISTORICAL_RELEASES', '').split(',') if d.strip()]
+TERC_RELEASE_PATTERN = os.getenv('TERC_RELEASE_PATTERN', 'TERC_Adresowy_{date}.csv')
+SIMC_RELEASE_PATTERN = os.getenv('SIMC_RELEASE_PATTERN', 'SIMC_Adresowy_{date}.csv')
+ULIC_RELEASE_PATTERN = os.getenv('ULIC_RELEASE_PATTERN', 'ULIC_Adresowy_{date}.csv')
+CURRENT_RELEASE_DATE = os.getenv('CURRENT_RELEASE_DATE') # Domyślnie data z nazwy pliku TERC lub z kolumny STAN_NA
+# Liczba odtworzonych wydań trzymanych w pamięci (0 - wszystkie załadowane wydania historyczne)
+RELEASE_VIEW_CACHE_SIZE = int(os.getenv('RELEASE_VIEW_CACHE_SIZE', '0'))
+
+# Nagłówek Server-Timing z czasami etapów: 'off', 'request' (tylko gdy klient wyśle 'X-Server-Timing: 1') lub 'always'
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'request').lower()
+# Logowanie: format 'text' lub 'json', kolejka (zapis logów w osobnym wątku - obejmuje też logi uvicorn)
+# oraz próbkowanie zdarzeń z gorącej ścieżki, np. LOG_SAMPLING="address_request=0.01,simc_lookup=0.1,http_access=0.05"
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE = os.getenv('LOG_QUEUE', 'true').lower() in ('1', 'true', 'yes')
+LOG_SAMPLING = {
+    event.strip(): float(rate)
+    for event, rate in (item.split('=', 1) for item in os.getenv('LOG_SAMPLING', '').split(',') if '=' in item)
+}
+# Rozgrzewanie po starcie: wyniki dla najczęściej odpytywanych kodów pocztowych trafiają do pamięci podręcznej,
+# zanim /health/ready zgłosi gotowość. Kody z WARMUP_POSTAL_CODES są rozgrzewane zawsze, a do tego WARMUP_TOP_N
+# najczęstszych kodów ze statystyk dostępu (ACCESS_STATS_FILE, zapisywany co ACCESS_STATS_FLUSH_SECONDS i przy zamknięciu aplikacji)
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+WARMUP_POSTAL_CODES = [pc.strip() for pc in os.getenv('WARMUP_POSTAL_CODES', '').split(',') if pc.strip()]
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', '50'))
+WARMUP_MAX_SECONDS = float(os.getenv('WARMUP_MAX_SECONDS', '120')) # Po tym czasie gotowość jest zgłaszana mimo niedokończonego rozgrzewania
+ACCESS_STATS_FILE = os.getenv('ACCESS_STATS_FILE') # Brak - statystyki dostępu tylko w pamięci
+ACCESS_STATS_MAX_ENTRIES = 10000
+# Okresowy zapis statystyk dostępu - zapis tylko przy zamknięciu gubiłby je przy zabiciu procesu (0 wyłącza)
+ACCESS_STATS_FLUSH_SECONDS = float(os.getenv('ACCESS_STATS_FLUSH_SECONDS', '300'))
+# Granice kubełków histogramów czasu (w sekundach)
+METRICS_BUCKETS = tuple(float(b) for b in os.getenv('METRICS_BUCKETS', '0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(','))
 
 COLUMN_DTYPES = {
     'WOJ': str, 'POW': str, 'GMI': str, 'RODZ': str, 'RODZ_GMI': str,
     'SYM': str, 'SYM_UL': str, 'SYMPOD': str, 'PNA': str
 }
 
-logging.basicConfig(level=logging.INFO)
+# Klucz miejscowości w indeksie ulic
+ULIC_INDEX_KEY = ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'SYM']
+
+# --- Logowanie ---
+
+class JsonFormatter(logging.Formatter):
+    """Formatuje rekord jako jedną linię JSON (typ zdarzenia i pola strukturalne jako osobne klucze).
+
+    Pola strukturalne nie mogą nadpisać kluczy stałych (time, level, logger, event, message).
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, 'event', None),
+            "message": record.getMessage(),
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            entry.setdefault(key, value)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler, który nie formatuje rekordu w wątku zapytania.
+
+    Standardowy QueueHandler składa komunikat przed włożeniem do kolejki; tutaj rekord trafia do kolejki
+    bez zmian i jest formatowany dopiero w wątku QueueListener. Argumenty logów muszą więc być
+    niezmienne (napisy, liczby) - nie przekazuj obiektów modyfikowanych po wywołaniu loggera.
+    """
+
+    def prepare(self, record):
+        return record
+
+def _sampled(event):
+    rate = LOG_SAMPLING.get(event)
+    return rate is None or rate >= 1 or random.random() < rate
+
+class EventSamplingFilter(logging.Filter):
+    """Próbkuje rekordy loggera (np. uvicorn.access) według stawki zdarzenia z LOG_SAMPLING."""
+
+    def __init__(self, event):
+        super().__init__()
+        self.event = event
+
+    def filter(self, record):
+        record.event = self.event
+        return _sampled(self.event)
+
+_log_listener: Optional[QueueListener] = None
+
+def _stop_log_listener():
+    """Zatrzymuje wątek zapisu logów (zapisując zaległe rekordy) - QueueListener.stop nie może być wywołane dwukrotnie."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+atexit.register(_stop_log_listener)
+
+def configure_logging():
+    """Konfiguruje logowanie aplikacji (format, poziom, kolejka i próbkowanie logów dostępu)."""
+    global _log_listener
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(logging.BASIC_FORMAT))
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    _stop_log_listener()
+    if LOG_QUEUE:
+        log_queue = queue.SimpleQueue()
+        _log_listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _log_listener.start()
+        root.handlers = [LazyQueueHandler(log_queue)]
+    else:
+        root.handlers = [handler]
+
+    access_logger = logging.getLogger('uvicorn.access')
+    if not any(isinstance(f, EventSamplingFilter) for f in access_logger.filters):
+        access_logger.addFilter(EventSamplingFilter('http_access'))
+    if LOG_FORMAT == 'json' or LOG_QUEUE:
+        # Logi uvicorn przez ten sam handler co logi aplikacji - cały strumień jest w JSON, a logi dostępu
+        # nie są zapisywane synchronicznie w wątku obsługującym zapytania
+        for name in ('uvicorn', 'uvicorn.error', 'uvicorn.access'):
+            logging.getLogger(name).handlers = []
+            logging.getLogger(name).propagate = True
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
+def log_event(level, event, msg, *args, **fields):
+    """Loguje zdarzenie z gorącej ścieżki zapytania.
+
+    Komunikat jest formatowany leniwie (styl %), a gdy poziom jest wyłączony albo zdarzenie zostało
+    odrzucone przez próbkowanie (LOG_SAMPLING), wywołanie kończy się przed utworzeniem rekordu.
+    Pola 'fields' trafiają jako osobne klucze do logów JSON.
+    """
+    if logger.isEnabledFor(level) and _sampled(event):
+        logger.log(level, msg, *args, extra={'event': event, 'fields': fields})
+
 # Globalne zmienne na DataFrame'y
 dataframes: Dict[str, pd.DataFrame] = {}
 terc_data: Optional[pd.DataFrame] = None
 simc_data: Optional[pd.DataFrame] = None
 ulic_data: Optional[pd.DataFrame] = None
 ulic_data_enriched: Optional[pd.DataFrame] = None
+# Indeks ulic: (WOJ, POW, GMI, RODZ_GMI, SYM) -> etykiety wierszy ulic tej miejscowości w ulic_data_enriched
+ulic_index: Dict[tuple, Any] = {}
+# Chroni spójność pary (ulic_data_enriched, ulic_index) podczas nakładania plików zmian - pliki zmian nadpisują
+# wiersze ulic w miejscu, więc wiersze według etykiet z indeksu też są odczytywane pod tą blokadą
+_ulic_lock = threading.Lock()
 kody_pocztowe_data: Optional[pd.DataFrame] = None
+# Indeks kodów pocztowych: PNA -> etykiety wierszy w kody_pocztowe_data
+kody_index: Dict[str, Any] = {}
+# Indeksy nazw jednostek bieżących danych: 'TERC'/'SIMC' -> NameIndex
+name_indexes: Dict[str, Any] = {}
+# Wersja załadowanego zbioru danych - zmienia się przy każdym (prze)ładowaniu,
+# dzięki czemu wyniki liczone na starych danych nie są współdzielone z nowymi zapytaniami
+dataset_version: int = 0
+# Wersja bieżących tabel TERC i SIMC - tylko z nich korzystają odtworzone widoki wydań historycznych
+# (ulice są wybierane z bieżących danych przy zapytaniu), więc pliki zmian ULIC nie unieważniają widoków
+terc_simc_version: int = 0
 
 # --- Konfiguracja autentykacji ---
 API_TOKEN = os.getenv("API_TOKEN", "7h3Oo9kg32B3LEy32Ec5dk810ydT8CwB")  # Ustaw swój token lub pobierz z env
@@ -41,12 +207,241 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
     if credentials.scheme != "Bearer" or credentials.credentials != API_TOKEN:
         raise HTTPException(status_code=401, detail="Invalid or missing authentication token")
 
+# --- Metryki (format tekstowy Prometheusa) ---
+
+class Metrics:
+    """Rejestr liczników, wartości chwilowych i histogramów eksportowany w formacie tekstowym Prometheusa."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._meta: Dict[str, tuple] = {} # nazwa -> (typ, opis), w kolejności deklaracji
+        self._values: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, list]] = {} # etykiety -> [liczniki kubełków..., +Inf, suma]
+
+    def describe(self, name, metric_type, help_text):
+        self._meta[name] = (metric_type, help_text)
+        (self._histograms if metric_type == 'histogram' else self._values).setdefault(name, {})
+
+    def inc(self, name, labels=(), amount=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def set(self, name, value, labels=()):
+        with self._lock:
+            self._values[name][labels] = value
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            series = self._histograms[name].get(labels)
+            if series is None:
+                series = self._histograms[name][labels] = [0] * (len(self.buckets) + 2)
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text) in self._meta.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                if metric_type != 'histogram':
+                    lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in self._values[name].items()]
+                    continue
+                for labels, series in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), series):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {series[-1]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+metrics = Metrics(METRICS_BUCKETS)
+metrics.describe('teryt_http_request_duration_seconds', 'histogram', 'Czas obsługi zapytania HTTP (z serializacją odpowiedzi).')
+metrics.describe('teryt_stage_duration_seconds', 'histogram', 'Czas etapów potoku wyszukiwania według endpointu (warmup - rozgrzewanie).')
+metrics.describe('teryt_response_cache_requests_total', 'counter', 'Trafienia i chybienia pamięci podręcznej odpowiedzi według endpointu (warmup - rozgrzewanie).')
+metrics.describe('teryt_response_cache_entries', 'gauge', 'Liczba odpowiedzi w pamięci podręcznej.')
+metrics.describe('teryt_single_flight_total', 'counter', 'Obliczenia wykonane i zapytania dołączone do trwających obliczeń.')
+metrics.describe('teryt_data_load_duration_seconds', 'gauge', 'Czas ostatniego ładowania danych według etapu.')
+metrics.describe('teryt_delta_apply_duration_seconds', 'histogram', 'Czas nakładania plików zmian według zbioru.')
+metrics.describe('teryt_dataset_rows', 'gauge', 'Liczba wierszy załadowanych zbiorów danych.')
+metrics.describe('teryt_ulic_index_localities', 'gauge', 'Liczba miejscowości w indeksie ulic.')
+metrics.describe('teryt_dataset_version', 'gauge', 'Wersja załadowanego zbioru danych.')
+metrics.describe('teryt_startup_rss_delta_bytes', 'gauge', 'Zmiana pamięci (RSS) procesu w etapie startu.')
+metrics.describe('teryt_ready', 'gauge', '1, jeśli dane są załadowane i rozgrzewanie zakończone.')
+
+# Profil startu: etap -> czas i pamięć (etapy: read, enrich, postal_codes, index, historical_releases, warmup)
+startup_profile: Dict[str, Dict[str, Any]] = {}
+
+def current_rss_bytes() -> Optional[int]:
+    """Bieżące RSS procesu (z /proc, więc tylko na Linuksie)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class StartupStage:
+    """Mierzy czas i zmianę pamięci (RSS) jednego etapu startu; wynik trafia do startup_profile i metryk."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.rss_start = current_rss_bytes()
+
+    def done(self):
+        seconds = time.perf_counter() - self.start
+        rss = current_rss_bytes()
+        rss_delta = rss - self.rss_start if rss is not None and self.rss_start is not None else None
+        startup_profile[self.name] = {
+            "seconds": round(seconds, 3),
+            "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+            "rss_delta_mb": round(rss_delta / 2**20, 1) if rss_delta is not None else None,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1), # ru_maxrss w KB (Linux)
+        }
+        metrics.set('teryt_data_load_duration_seconds', seconds, (('stage', self.name),))
+        if rss_delta is not None:
+            metrics.set('teryt_startup_rss_delta_bytes', rss_delta, (('stage', self.name),))
+
+# Czasy etapów bieżącego zapytania (dla nagłówka Server-Timing); lista jest współdzielona z wątkami puli,
+# bo run_in_threadpool kopiuje kontekst zapytania
+_request_timings: ContextVar[Optional[list]] = ContextVar('request_timings', default=None)
+# Zakres ASGI bieżącego zapytania - router dopisuje do niego dopasowaną trasę, która jest etykietą 'endpoint'
+# metryk etapów i pamięci podręcznej (trasa jest znana dopiero po dopasowaniu, więc odczytywana przy pomiarze)
+_request_scope: ContextVar[Optional[dict]] = ContextVar('request_scope', default=None)
+# Etykieta 'endpoint' dla obliczeń poza zapytaniami HTTP (np. 'warmup' podczas rozgrzewania)
+_background_endpoint: ContextVar[str] = ContextVar('background_endpoint', default='background')
+
+def current_endpoint():
+    """Etykieta 'endpoint' bieżącego pomiaru: ścieżka dopasowanej trasy albo etykieta obliczeń w tle."""
+    scope = _request_scope.get()
+    if scope is None:
+        return _background_endpoint.get()
+    return getattr(scope.get('route'), 'path', 'unmatched')
+
+def record_stage(stage, seconds):
+    metrics.observe('teryt_stage_duration_seconds', seconds, (('endpoint', current_endpoint()), ('stage', stage)))
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds, None))
+
+@contextmanager
+def stage_timer(stage):
+    """Mierzy czas bloku kodu jako etap potoku wyszukiwania."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def timed_stage(stage):
+    """Dekorator mierzący czas wywołania funkcji jako etap potoku wyszukiwania."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_endpoint(func):
+    """Mierzy czas samej funkcji endpointu; reszta czasu zapytania to walidacja i serializacja odpowiedzi."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with stage_timer('handler'):
+            return await func(*args, **kwargs)
+    return wrapper
+
+def record_cache_result(cache, hit):
+    result = 'hit' if hit else 'miss'
+    metrics.inc('teryt_response_cache_requests_total', (('endpoint', current_endpoint()), ('cache', cache), ('result', result)))
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append(('cache', None, result))
+
+class MetricsMiddleware:
+    """Middleware ASGI mierzące czas zapytań i dodające nagłówek Server-Timing (jeśli włączony)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        timings = []
+        token = _request_timings.set(timings)
+        scope_token = _request_scope.set(scope)
+        start = time.perf_counter()
+        status = {'code': 500}
+        headers = dict(scope.get('headers') or [])
+        server_timing = SERVER_TIMING == 'always' or (SERVER_TIMING == 'request' and headers.get(b'x-server-timing') == b'1')
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+                if server_timing:
+                    message.setdefault('headers', [])
+                    message['headers'] = list(message['headers']) + [(b'server-timing', _server_timing_header(timings, time.perf_counter() - start).encode('latin-1'))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            total = time.perf_counter() - start
+            handler = sum(seconds for stage, seconds, _ in timings if stage == 'handler')
+            if handler:
+                record_stage('serialization', max(total - handler, 0.0))
+            _request_scope.reset(scope_token)
+            route = scope.get('route')
+            labels = (('endpoint', getattr(route, 'path', 'unmatched')), ('method', scope['method']), ('status', str(status['code'])))
+            metrics.observe('teryt_http_request_duration_seconds', total, labels)
+
+def _server_timing_header(timings, total):
+    """Łączy czasy etapów o tej samej nazwie (np. kilka wyszukiwań ulic) w jeden wpis nagłówka."""
+    durations: Dict[str, float] = {}
+    descriptions: Dict[str, str] = {}
+    for stage, seconds, description in timings:
+        if seconds is not None:
+            durations[stage] = durations.get(stage, 0.0) + seconds
+        if description:
+            descriptions[stage] = description
+    entries = [f'{stage};desc="{description}"' for stage, description in descriptions.items() if stage not in durations]
+    if 'handler' in durations:
+        durations['serialization'] = max(total - durations['handler'], 0.0)
+    entries += [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+def collect_runtime_metrics():
+    """Uzupełnia wartości chwilowe (rozmiary danych, pamięć podręczna) przed eksportem metryk."""
+    datasets = {'TERC': terc_data, 'SIMC': simc_data, 'ULIC': ulic_data, 'ULIC_ENRICHED': ulic_data_enriched, 'KODY_POCZTOWE': kody_pocztowe_data}
+    for name, df in datasets.items():
+        metrics.set('teryt_dataset_rows', len(df) if df is not None else 0, (('dataset', name),))
+    metrics.set('teryt_ulic_index_localities', len(ulic_index))
+    metrics.set('teryt_dataset_version', dataset_version)
+    metrics.set('teryt_response_cache_entries', response_cache.stats()['size'])
+    metrics.set('teryt_ready', int(is_ready()))
+    flight_stats = single_flight.stats()
+    metrics.set('teryt_single_flight_total', flight_stats['computations'], (('result', 'computed'),))
+    metrics.set('teryt_single_flight_total', flight_stats['coalesced'], (('result', 'coalesced'),))
+
 # --- Funkcje pomocnicze ---
 
 def load_data_on_startup():
     """Ładuje pliki CSV do globalnych DataFrame'ów podczas startu aplikacji."""
-    global dataframes, terc_data, simc_data, ulic_data, kody_pocztowe_data, ulic_data_enriched
+    global dataframes, terc_data, simc_data, ulic_data, kody_pocztowe_data, ulic_data_enriched, ulic_index, kody_index, name_indexes, dataset_version, terc_simc_version
     logger.info(f"Rozpoczynanie ładowania danych z katalogu: {DATA_DIR}")
+    load_stage = StartupStage('total')
+    stage = StartupStage('read')
     if not os.path.exists(DATA_DIR):
         logger.error(f"Katalog '{DATA_DIR}' nie istnieje. Nie można załadować danych.")
         return
@@ -93,10 +488,13 @@ def load_data_on_startup():
             logger.warning(f"Plik {file_name} nie znaleziony w {DATA_DIR}.")
 
     logger.info(f"Zakończono ładowanie danych. Załadowano {loaded_files_count} z {len(required_files)} wymaganych plików.")
+    stage.done()
 
     # Wzbogacanie danych ULIC po załadowaniu
     if ulic_data is not None and simc_data is not None:
+        stage = StartupStage('enrich')
         ulic_data_enriched = enrich_ulic_data(ulic_data, simc_data)
+        stage.done()
         if ulic_data_enriched is not None:
             logger.info("Pomyślnie wzbogacono dane ULIC o nazwy miejscowości.")
         else:
@@ -106,6 +504,7 @@ def load_data_on_startup():
 
     # Przygotowanie danych kodów pocztowych
     if kody_pocztowe_data is not None:
+        stage = StartupStage('postal_codes')
         try:
             if 'PNA' in kody_pocztowe_data.columns:
                 kody_pocztowe_data['PNA'] = kody_pocztowe_data['PNA'].astype(str)
@@ -125,6 +524,24 @@ def load_data_on_startup():
         except Exception as e:
             logger.error(f"Błąd podczas przygotowywania danych kodów pocztowych: {e}")
             kody_pocztowe_data = None
+        stage.done()
+
+    # Indeksy używane przy każdym zapytaniu
+    stage = StartupStage('index')
+    if ulic_data_enriched is not None:
+        with _ulic_lock:
+            ulic_index = build_ulic_index(ulic_data_enriched)
+        logger.info(f"Zbudowano indeks ulic dla {len(ulic_index)} miejscowości.")
+    if kody_pocztowe_data is not None:
+        kody_index = build_postal_code_index(kody_pocztowe_data)
+        logger.info(f"Zbudowano indeks dla {len(kody_index)} kodów pocztowych.")
+    name_indexes = build_name_indexes(terc_data, simc_data)
+    stage.done()
+
+    dataset_version += 1
+    terc_simc_version += 1
+    response_cache.clear()
+    load_stage.done()
 
 
 def enrich_ulic_data(ulic_df, simc_df):
@@ -183,7 +600,108 @@ def enrich_ulic_data(ulic_df, simc_df):
         logger.error(f"Błąd podczas wzbogacania danych ULIC: {e}")
         return None
 
-def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_hint=None):
+def build_ulic_index(ulic_enriched_df):
+    """Grupuje wzbogacone dane ULIC według miejscowości, aby wyszukiwanie ulic nie przeglądało całej tabeli.
+
+    Indeks przechowuje etykiety wierszy, a nie kopie danych - tworzenie osobnego DataFrame'a
+    dla każdej z kilkudziesięciu tysięcy miejscowości trwałoby kilkanaście sekund.
+    """
+    if ulic_enriched_df is None or not all(col in ulic_enriched_df.columns for col in ULIC_INDEX_KEY):
+        return {}
+    labels = ulic_enriched_df.index.to_numpy()
+    return {key: labels[positions] for key, positions in ulic_enriched_df.groupby(ULIC_INDEX_KEY, sort=False).indices.items()}
+
+def build_postal_code_index(kody_df):
+    """Buduje indeks PNA -> etykiety wierszy pliku kodów pocztowych."""
+    labels = kody_df.index.to_numpy()
+    return {postal_code: labels[positions] for postal_code, positions in kody_df.groupby('PNA', sort=False).indices.items()}
+
+class NameIndex:
+    """Indeks nazw jednostek TERC lub SIMC: nazwa małymi literami -> pozycje wierszy tabeli.
+
+    Nazwy są przechowywane w posortowanej tablicy, więc wyszukanie jednostki po nazwie to wyszukiwanie
+    binarne zamiast str.lower() całej kolumny przy każdym zapytaniu. Wiersze o tej samej nazwie są
+    zwracane w kolejności tabeli, więc dalsze warunki i wybór pierwszego pasującego wiersza dają ten sam
+    wynik co przegląd całej tabeli.
+    """
+
+    def __init__(self, df, strip=False, names=None, positions=None):
+        self.df = df
+        self.strip = strip # SIMC porównuje nazwy bez otaczających białych znaków
+        if names is None:
+            normalized = self._normalize(df['NAZWA'])
+            valid = np.flatnonzero(normalized.notna().to_numpy())
+            names = normalized.to_numpy()[valid]
+            order = np.argsort(names, kind='stable')
+            names, positions = names[order], valid[order]
+        self.names, self.positions = names, positions
+
+    def _normalize(self, values):
+        return values.str.strip().str.lower() if self.strip else values.str.lower()
+
+    def rows(self, *names):
+        """Wiersze tabeli o którejkolwiek z podanych nazw (już znormalizowanych), w kolejności tabeli."""
+        found = [self.positions[np.searchsorted(self.names, name, 'left'):np.searchsorted(self.names, name, 'right')] for name in set(names)]
+        return self.df.iloc[np.sort(np.concatenate(found))]
+
+    def updated(self, df, labels, changed_labels):
+        """Indeks tabeli df (z etykietami 0..n-1) powstałej z indeksowanej tabeli przez plik zmian.
+
+        labels to etykiety wierszy df sprzed przenumerowania - dla wierszy indeksowanej tabeli ich dawne
+        pozycje, a dla dodanych wierszy kolejne etykiety za nimi. Nazwy wierszy changed_labels (dodanych
+        lub nadpisanych) są indeksowane od nowa, pozostałe wpisy tylko przesuwane na nowe pozycje.
+        """
+        labels = np.asarray(labels)
+        kept = labels < len(self.df)
+        old_to_new = np.full(len(self.df), -1, dtype=np.intp)
+        old_to_new[labels[kept]] = np.flatnonzero(kept) # Rosnąco - kolejność wpisów o tej samej nazwie się nie zmienia
+        changed = np.flatnonzero(np.isin(labels, np.asarray(changed_labels, dtype=labels.dtype)))
+        positions = old_to_new[self.positions]
+        keep = (positions >= 0) & ~np.isin(positions, changed)
+        names, positions = self.names[keep], positions[keep]
+
+        new_names = self._normalize(df['NAZWA'].iloc[changed])
+        valid = new_names.notna().to_numpy()
+        entries = []
+        for name, position in zip(new_names.to_numpy()[valid], changed[valid]):
+            lo, hi = np.searchsorted(names, name, 'left'), np.searchsorted(names, name, 'right')
+            entries.append((lo + int(np.searchsorted(positions[lo:hi], position)), name, position))
+        entries.sort()
+        if entries:
+            at = [entry[0] for entry in entries]
+            names = np.insert(names, at, np.array([entry[1] for entry in entries], dtype=object))
+            positions = np.insert(positions, at, [entry[2] for entry in entries])
+        return NameIndex(df, self.strip, names, positions)
+
+def build_name_indexes(terc_df, simc_df):
+    """Buduje indeksy nazw dla tabel TERC i SIMC (pomijając niezaładowane)."""
+    indexes = {}
+    if terc_df is not None and 'NAZWA' in terc_df.columns:
+        indexes['TERC'] = NameIndex(terc_df)
+    if simc_df is not None and 'NAZWA' in simc_df.columns:
+        indexes['SIMC'] = NameIndex(simc_df, strip=True)
+    return indexes
+
+@timed_stage('postal_code')
+def get_postal_code_rows(postal_code):
+    """Zwraca wiersze pliku kodów pocztowych dla podanego kodu (przez indeks, bez skanowania całej tabeli)."""
+    labels = kody_index.get(postal_code)
+    if labels is None:
+        return kody_pocztowe_data.iloc[0:0]
+    return kody_pocztowe_data.loc[labels]
+
+@timed_stage('ulic_lookup')
+def get_candidate_streets(terc_gmi_full, simc_code, release=None):
+    """Zwraca wiersze wzbogaconych danych ULIC dla miejscowości o podanym TERC gminy i kodzie SIMC."""
+    woj, pow, gmi, rodz_gmi = terc_gmi_full[:2], terc_gmi_full[2:4], terc_gmi_full[4:6], terc_gmi_full[6]
+    if release:
+        return release.get_streets((woj, pow, gmi, rodz_gmi, simc_code))
+    with _ulic_lock:
+        labels = ulic_index.get((woj, pow, gmi, rodz_gmi, simc_code))
+        return ulic_data_enriched.loc[labels] if labels is not None else ulic_data_enriched.iloc[0:0]
+
+@timed_stage('terc')
+def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_hint=None, release=None):
     """Wyszukuje kody TERC dla województwa, powiatu i gminy.
 
     Args:
@@ -192,8 +710,10 @@ def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_
         gmi_nazwa: Nazwa gminy
         miejscowosc_nazwa: Nazwa miejscowości
         rodz_gmi_hint: Opcjonalny hint dla typu gminy (4=miasto, 5=obszar wiejski) z SIMC
+        release: Opcjonalne historyczne wydanie TERYT (domyślnie bieżące dane)
     """
-    if terc_data is None:
+    terc_index = (release.name_indexes if release else name_indexes).get('TERC')
+    if terc_index is None:
         logger.error("Dane TERC nie są załadowane, nie można wyszukać kodów.")
         return None, None, None
 
@@ -203,36 +723,36 @@ def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_
     try:
         # Wyszukiwanie województwa
         if woj_nazwa:
-            woj_row = terc_data[terc_data['NAZWA'].str.lower() == woj_nazwa.lower()]
+            woj_row = terc_index.rows(woj_nazwa.lower())
             if not woj_row.empty:
                 woj_code = woj_row['WOJ'].iloc[0]
                 terc_woj = woj_code
             else:
-                logger.warning(f"Nie znaleziono kodu TERC dla województwa: {woj_nazwa}")
+                log_event(logging.WARNING, 'terc_lookup', "Nie znaleziono kodu TERC dla województwa: %s", woj_nazwa)
 
         # Wyszukiwanie powiatu (wymaga kodu województwa)
         if woj_code and pow_nazwa:
-            pow_row = terc_data[
-                (terc_data['NAZWA'].str.lower() == pow_nazwa.lower()) &
-                (terc_data['WOJ'] == woj_code) &
-                (terc_data['POW'].notna()) & # Powiat ma kod POW
-                (terc_data['GMI'].isna())    # Powiat nie ma kodu GMI
+            pow_rows = terc_index.rows(pow_nazwa.lower())
+            pow_row = pow_rows[
+                (pow_rows['WOJ'] == woj_code) &
+                (pow_rows['POW'].notna()) & # Powiat ma kod POW
+                (pow_rows['GMI'].isna())    # Powiat nie ma kodu GMI
             ]
             if not pow_row.empty:
                 pow_code = pow_row['POW'].iloc[0]
                 terc_pow = f"{woj_code}{pow_code}"
             else:
-                logger.warning(f"Nie znaleziono kodu TERC dla powiatu: {pow_nazwa} w woj. {woj_nazwa}")
+                log_event(logging.WARNING, 'terc_lookup', "Nie znaleziono kodu TERC dla powiatu: %s w woj. %s", pow_nazwa, woj_nazwa)
 
         # Wyszukiwanie gminy (wymaga kodu województwa i powiatu)
         if woj_code and pow_code and gmi_nazwa:
              # Szukaj najpierw po nazwie gminy, potem po nazwie miejscowości jako fallback
-             gmi_row = terc_data[
-                 ((terc_data['NAZWA'].str.lower() == gmi_nazwa.lower()) | (terc_data['NAZWA'].str.lower() == miejscowosc_nazwa.lower())) &
-                 (terc_data['WOJ'] == woj_code) &
-                 (terc_data['POW'] == pow_code) &
-                 (terc_data['GMI'].notna()) & # Gmina ma kod GMI
-                 (terc_data['RODZ'].notna())  # Gmina ma rodzaj
+             gmi_rows = terc_index.rows(gmi_nazwa.lower(), miejscowosc_nazwa.lower())
+             gmi_row = gmi_rows[
+                 (gmi_rows['WOJ'] == woj_code) &
+                 (gmi_rows['POW'] == pow_code) &
+                 (gmi_rows['GMI'].notna()) & # Gmina ma kod GMI
+                 (gmi_rows['RODZ'].notna())  # Gmina ma rodzaj
              ]
 
              # Jeśli mamy hint RODZ_GMI z SIMC, użyj go do precyzyjnego wyboru
@@ -240,7 +760,7 @@ def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_
                  gmi_row_with_hint = gmi_row[gmi_row['RODZ'] == rodz_gmi_hint]
                  if not gmi_row_with_hint.empty:
                      gmi_row = gmi_row_with_hint
-                     logger.info(f"Użyto RODZ_GMI hint ({rodz_gmi_hint}) dla gminy '{gmi_nazwa}'")
+                     log_event(logging.INFO, 'terc_lookup', "Użyto RODZ_GMI hint (%s) dla gminy '%s'", rodz_gmi_hint, gmi_nazwa)
 
              if not gmi_row.empty:
                  if len(gmi_row) > 1:
@@ -249,11 +769,11 @@ def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_
                      if not gmi_row_preferred.empty:
                          gmi_row = gmi_row_preferred
                      else:
-                         logger.info(f"Znaleziono wiele pasujących gmin TERC dla '{gmi_nazwa}'/'{miejscowosc_nazwa}'. Wybieram pierwszy znaleziony.")
+                         log_event(logging.INFO, 'terc_lookup', "Znaleziono wiele pasujących gmin TERC dla '%s'/'%s'. Wybieram pierwszy znaleziony.", gmi_nazwa, miejscowosc_nazwa)
                  gmi_data = gmi_row.iloc[0]
                  terc_gmi_full = f"{gmi_data['WOJ']}{gmi_data['POW']}{gmi_data['GMI']}{gmi_data['RODZ']}"
              else:
-                 logger.warning(f"Nie znaleziono kodu TERC dla gminy: {gmi_nazwa} ani miejscowości: {miejscowosc_nazwa} w powiecie {pow_nazwa}")
+                 log_event(logging.WARNING, 'terc_lookup', "Nie znaleziono kodu TERC dla gminy: %s ani miejscowości: %s w powiecie %s", gmi_nazwa, miejscowosc_nazwa, pow_nazwa)
 
     except Exception as e:
         logger.error(f"Błąd podczas wyszukiwania kodów TERC: {e}")
@@ -261,71 +781,76 @@ def get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, rodz_gmi_
 
     return terc_woj, terc_pow, terc_gmi_full
 
-def get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa):
+@timed_stage('rodz_gmi')
+def get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, miejscowosc_nazwa, release=None):
     """Wyszukuje RODZ_GMI dla miejscowości bezpośrednio z SIMC, aby określić czy to miasto czy wieś.
 
     Returns:
         rodz_gmi (str): '4' dla miasta, '5' dla obszaru wiejskiego, lub None
     """
-    if simc_data is None or terc_data is None:
+    indexes = release.name_indexes if release else name_indexes
+    terc_index, simc_index = indexes.get('TERC'), indexes.get('SIMC')
+    if simc_index is None or terc_index is None:
         logger.error("Dane SIMC lub TERC nie są załadowane.")
         return None
 
     try:
         # Najpierw znajdź kody województwa i powiatu
-        woj_row = terc_data[terc_data['NAZWA'].str.lower() == woj_nazwa.lower()]
+        woj_row = terc_index.rows(woj_nazwa.lower())
         if woj_row.empty:
             return None
         woj_code = woj_row['WOJ'].iloc[0]
 
-        pow_row = terc_data[
-            (terc_data['NAZWA'].str.lower() == pow_nazwa.lower()) &
-            (terc_data['WOJ'] == woj_code) &
-            (terc_data['POW'].notna()) &
-            (terc_data['GMI'].isna())
+        pow_rows = terc_index.rows(pow_nazwa.lower())
+        pow_row = pow_rows[
+            (pow_rows['WOJ'] == woj_code) &
+            (pow_rows['POW'].notna()) &
+            (pow_rows['GMI'].isna())
         ]
         if pow_row.empty:
             return None
         pow_code = pow_row['POW'].iloc[0]
 
         # Znajdź kod gminy (bez RODZ)
-        gmi_row = terc_data[
-            ((terc_data['NAZWA'].str.lower() == gmi_nazwa.lower()) | (terc_data['NAZWA'].str.lower() == miejscowosc_nazwa.lower())) &
-            (terc_data['WOJ'] == woj_code) &
-            (terc_data['POW'] == pow_code) &
-            (terc_data['GMI'].notna())
+        gmi_rows = terc_index.rows(gmi_nazwa.lower(), miejscowosc_nazwa.lower())
+        gmi_row = gmi_rows[
+            (gmi_rows['WOJ'] == woj_code) &
+            (gmi_rows['POW'] == pow_code) &
+            (gmi_rows['GMI'].notna())
         ]
         if gmi_row.empty:
             return None
         gmi_code = gmi_row['GMI'].iloc[0]
 
         # Teraz szukaj miejscowości w SIMC
-        matching_simc = simc_data[
-            (simc_data['WOJ'] == woj_code) &
-            (simc_data['POW'] == pow_code) &
-            (simc_data['GMI'] == gmi_code) &
-            (simc_data['NAZWA'].str.strip().str.lower() == miejscowosc_nazwa.strip().lower())
+        simc_rows = simc_index.rows(miejscowosc_nazwa.strip().lower())
+        matching_simc = simc_rows[
+            (simc_rows['WOJ'] == woj_code) &
+            (simc_rows['POW'] == pow_code) &
+            (simc_rows['GMI'] == gmi_code)
         ]
 
         if not matching_simc.empty:
             rodz_gmi = matching_simc['RODZ_GMI'].iloc[0]
-            logger.info(f"Znaleziono RODZ_GMI={rodz_gmi} dla miejscowości '{miejscowosc_nazwa}' w SIMC")
+            log_event(logging.INFO, 'rodz_gmi_lookup', "Znaleziono RODZ_GMI=%s dla miejscowości '%s' w SIMC", rodz_gmi, miejscowosc_nazwa)
             return rodz_gmi
         else:
-            logger.warning(f"Nie znaleziono miejscowości '{miejscowosc_nazwa}' w SIMC dla gminy {gmi_nazwa}")
+            log_event(logging.WARNING, 'rodz_gmi_lookup', "Nie znaleziono miejscowości '%s' w SIMC dla gminy %s", miejscowosc_nazwa, gmi_nazwa)
             return None
 
     except Exception as e:
         logger.error(f"Błąd podczas wyszukiwania RODZ_GMI z SIMC: {e}")
         return None
 
-def get_simc_code(terc_gmi_full, miejscowosc_nazwa, gmina_nazwa):
+@timed_stage('simc')
+def get_simc_code(terc_gmi_full, miejscowosc_nazwa, gmina_nazwa, release=None):
     """Wyszukuje kod SIMC dla podanego TERC gminy i nazwy miejscowości (z fallbackiem na nazwę gminy)."""
-    if simc_data is None:
+    simc_index = (release.name_indexes if release else name_indexes).get('SIMC')
+    if simc_index is None:
         logger.error("Dane SIMC nie są załadowane, nie można wyszukać kodu.")
         return None, None
     if not terc_gmi_full or len(terc_gmi_full) != 7:
-        logger.warning(f"Nieprawidłowy TERC gminy '{terc_gmi_full}' przekazany do wyszukiwania SIMC.")
+        log_event(logging.WARNING, 'simc_lookup', "Nieprawidłowy TERC gminy '%s' przekazany do wyszukiwania SIMC.", terc_gmi_full)
         return None, None
 
     woj, pow, gmi, rodz_gmi = terc_gmi_full[:2], terc_gmi_full[2:4], terc_gmi_full[4:6], terc_gmi_full[6]
@@ -333,57 +858,55 @@ def get_simc_code(terc_gmi_full, miejscowosc_nazwa, gmina_nazwa):
 
     try:
         # Krok 1: Wyszukaj po nazwie miejscowości
-        matching_simc = simc_data[
-            (simc_data['WOJ'] == woj) &
-            (simc_data['POW'] == pow) &
-            (simc_data['GMI'] == gmi) &
-            (simc_data['RODZ_GMI'] == rodz_gmi) &
-            (simc_data['NAZWA'].str.strip().str.lower() == miejscowosc_nazwa.strip().lower())
+        simc_rows = simc_index.rows(miejscowosc_nazwa.strip().lower())
+        matching_simc = simc_rows[
+            (simc_rows['WOJ'] == woj) &
+            (simc_rows['POW'] == pow) &
+            (simc_rows['GMI'] == gmi) &
+            (simc_rows['RODZ_GMI'] == rodz_gmi)
         ]
         if not matching_simc.empty:
             if len(matching_simc) > 1:
-                logger.info(f"Znaleziono wiele wpisów SIMC dla miejscowości '{miejscowosc_nazwa}'. Wybieram pierwszy.")
+                log_event(logging.INFO, 'simc_lookup', "Znaleziono wiele wpisów SIMC dla miejscowości '%s'. Wybieram pierwszy.", miejscowosc_nazwa)
             simc_details = matching_simc.iloc[0]
             sym_code = simc_details['SYM']
             found_name = simc_details['NAZWA'] # Zwróć oficjalną nazwę z SIMC
-            logger.info(f"Znaleziono kod SIMC dla miejscowości '{miejscowosc_nazwa}': {sym_code}")
+            log_event(logging.INFO, 'simc_lookup', "Znaleziono kod SIMC dla miejscowości '%s': %s", miejscowosc_nazwa, sym_code, simc=sym_code)
             return sym_code, found_name
         else:
             # Krok 2: Fallback - Wyszukaj po nazwie gminy
-            logger.info(f"Nie znaleziono SIMC dla '{miejscowosc_nazwa}'. Próba dla nazwy gminy '{gmina_nazwa}'...")
-            matching_simc_fallback = simc_data[
-                (simc_data['WOJ'] == woj) &
-                (simc_data['POW'] == pow) &
-                (simc_data['GMI'] == gmi) &
-                (simc_data['RODZ_GMI'] == rodz_gmi) &
-                (simc_data['NAZWA'].str.strip().str.lower() == gmina_nazwa.strip().lower())
+            log_event(logging.INFO, 'simc_lookup', "Nie znaleziono SIMC dla '%s'. Próba dla nazwy gminy '%s'...", miejscowosc_nazwa, gmina_nazwa)
+            simc_rows = simc_index.rows(gmina_nazwa.strip().lower())
+            matching_simc_fallback = simc_rows[
+                (simc_rows['WOJ'] == woj) &
+                (simc_rows['POW'] == pow) &
+                (simc_rows['GMI'] == gmi) &
+                (simc_rows['RODZ_GMI'] == rodz_gmi)
             ]
             if not matching_simc_fallback.empty:
                 if len(matching_simc_fallback) > 1:
-                    logger.info(f"Znaleziono wiele wpisów SIMC dla nazwy gminy '{gmina_nazwa}'. Wybieram pierwszy.")
+                    log_event(logging.INFO, 'simc_lookup', "Znaleziono wiele wpisów SIMC dla nazwy gminy '%s'. Wybieram pierwszy.", gmina_nazwa)
                 simc_details_fallback = matching_simc_fallback.iloc[0]
                 sym_code = simc_details_fallback['SYM']
                 found_name = simc_details_fallback['NAZWA'] # Zwróć oficjalną nazwę z SIMC
-                logger.info(f"Znaleziono kod SIMC dla nazwy gminy '{gmina_nazwa}' (fallback): {sym_code}")
+                log_event(logging.INFO, 'simc_lookup', "Znaleziono kod SIMC dla nazwy gminy '%s' (fallback): %s", gmina_nazwa, sym_code, simc=sym_code)
                 return sym_code, found_name
             else:
-                logger.warning(f"Nie znaleziono kodu SIMC ani dla miejscowości '{miejscowosc_nazwa}', ani dla nazwy gminy '{gmina_nazwa}' (TERC gminy: {terc_gmi_full})")
+                log_event(logging.WARNING, 'simc_lookup', "Nie znaleziono kodu SIMC ani dla miejscowości '%s', ani dla nazwy gminy '%s' (TERC gminy: %s)", miejscowosc_nazwa, gmina_nazwa, terc_gmi_full)
                 return None, None
     except Exception as e:
         logger.error(f"Błąd podczas wyszukiwania kodu SIMC: {e}")
         return None, None
 
-def get_ulic_data(terc_gmi_full, simc_code):
+def get_ulic_data(terc_gmi_full, simc_code, release=None):
     """Wyszukuje dane ULIC dla podanego TERC GMI i kodu SIMC, zwraca DataFrame z angielskimi nazwami kolumn."""
     if ulic_data_enriched is None:
         logger.error("Wzbogacone dane ULIC nie są dostępne, nie można wyszukać ulic.")
         return pd.DataFrame() # Zwróć pusty DataFrame
     if not terc_gmi_full or len(terc_gmi_full) != 7 or not simc_code:
-        logger.warning("Nie można wyszukać ULIC: brak wzbogaconych danych ULIC, nieprawidłowy TERC GMI lub brak kodu SIMC.")
+        log_event(logging.WARNING, 'ulic_lookup', "Nie można wyszukać ULIC: brak wzbogaconych danych ULIC, nieprawidłowy TERC GMI lub brak kodu SIMC.")
         return pd.DataFrame()
 
-    woj, pow, gmi, rodz_gmi = terc_gmi_full[:2], terc_gmi_full[2:4], terc_gmi_full[4:6], terc_gmi_full[6]
-
     try:
         # Sprawdź, czy wymagane kolumny istnieją
         required_ulic_cols = ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'SYM', 'SYM_UL', 'CECHA', 'NAZWA_ULICY_FULL', 'STAN_NA']
@@ -392,16 +915,10 @@ def get_ulic_data(terc_gmi_full, simc_code):
              logger.error(f"Brakujące kolumny w wzbogaconych danych ULIC: {missing_cols}")
              return pd.DataFrame()
 
-        matching_ulic = ulic_data_enriched[
-            (ulic_data_enriched['WOJ'] == woj) &
-            (ulic_data_enriched['POW'] == pow) &
-            (ulic_data_enriched['GMI'] == gmi) &
-            (ulic_data_enriched['RODZ_GMI'] == rodz_gmi) &
-            (ulic_data_enriched['SYM'] == simc_code)
-        ].copy()
+        matching_ulic = get_candidate_streets(terc_gmi_full, simc_code, release)
 
         if not matching_ulic.empty:
-            logger.info(f"Znaleziono {len(matching_ulic)} ulic dla SIMC: {simc_code}")
+            log_event(logging.INFO, 'ulic_lookup', "Znaleziono %d ulic dla SIMC: %s", len(matching_ulic), simc_code, simc=simc_code)
             # Zmień nazwy kolumn na angielskie dla spójności API
             result_df = matching_ulic[['SYM_UL', 'CECHA', 'NAZWA_ULICY_FULL', 'STAN_NA']].rename(
                 columns={
@@ -423,7 +940,7 @@ def get_ulic_data(terc_gmi_full, simc_code):
             
             return result_df
         else:
-            logger.warning(f"Nie znaleziono kodów ULIC dla SIMC: {simc_code} (TERC GMI: {terc_gmi_full}).")
+            log_event(logging.WARNING, 'ulic_lookup', "Nie znaleziono kodów ULIC dla SIMC: %s (TERC GMI: %s).", simc_code, terc_gmi_full, simc=simc_code)
             return pd.DataFrame()
     except KeyError as e:
         logger.error(f"Błąd klucza podczas wyszukiwania ULIC (brakująca kolumna?): {e}")
@@ -432,6 +949,734 @@ def get_ulic_data(terc_gmi_full, simc_code):
         logger.error(f"Błąd podczas wyszukiwania danych ULIC: {e}")
         return pd.DataFrame()
 
+# --- Deduplikacja równoległych zapytań (single-flight) ---
+
+class SingleFlight:
+    """Łączy równoległe, identyczne zapytania w jedno obliczenie.
+
+    Pierwsze zapytanie o dany klucz uruchamia obliczenie w puli wątków, a kolejne
+    zapytania o ten sam klucz, które przyjdą zanim się ono zakończy, czekają na ten sam
+    wynik (lub ten sam wyjątek) zamiast liczyć go ponownie.
+
+    Klucz jest znormalizowany (np. bez rozróżniania wielkości liter), a komunikaty błędów
+    powtarzają dane wejściowe w oryginalnym zapisie - dlatego zapytanie, które otrzymało
+    HTTPException z obliczenia rozpoczętego dla innego zapisu tych samych danych, liczy
+    odpowiedź ponownie dla własnych parametrów.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Any, tuple] = {} # klucz -> (zadanie, argumenty pierwszego zapytania)
+        self.computations = 0 # Liczba faktycznie wykonanych obliczeń
+        self.coalesced = 0    # Liczba zapytań obsłużonych wynikiem (lub błędem) innego, trwającego obliczenia
+
+    async def do(self, key, func, *args):
+        task, leader_args = self._in_flight.get(key, (None, args))
+        leader = task is None
+        if leader:
+            # Obliczenie działa jako osobne zadanie, więc anulowanie zapytania, które je
+            # rozpoczęło (np. rozłączenie klienta), nie przerywa go pozostałym oczekującym
+            task = asyncio.ensure_future(run_in_threadpool(func, *args))
+            self._in_flight[key] = (task, args)
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.computations += 1
+        try:
+            result = await asyncio.shield(task)
+        except HTTPException:
+            if leader_args != args:
+                # Szczegóły błędu zawierają dane wejściowe innego zapytania - policz błąd dla własnych parametrów
+                self.computations += 1
+                return await run_in_threadpool(func, *args)
+            if not leader:
+                self.coalesced += 1
+            raise
+        if not leader:
+            self.coalesced += 1
+        return result
+
+    def _finish(self, key, task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception() # Oznacz wyjątek jako odebrany, nawet jeśli wszyscy oczekujący się rozłączyli
+
+    def stats(self) -> Dict[str, int]:
+        return {"computations": self.computations, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+single_flight = SingleFlight()
+
+# --- Pamięć podręczna odpowiedzi ---
+
+class ResponseCache:
+    """Pamięć podręczna LRU gotowych odpowiedzi endpointów wyszukiwania.
+
+    Każdy wpis pamięta kod SIMC i TERC gminy, z których powstał, dzięki czemu
+    aktualizacja danych plikiem zmian unieważnia tylko odpowiedzi dotyczące
+    zmienionych miejscowości i gmin, a nie całą pamięć podręczną.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict() # klucz -> (odpowiedź, SIMC, TERC gminy)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response, version: int, sym_code: Optional[str], terc_gmi_full: Optional[str]):
+        """Zapisuje odpowiedź, o ile została policzona na aktualnej wersji danych."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if version != dataset_version:
+                return # Dane zmieniły się w trakcie obliczeń - wynik może być nieaktualny
+            self._entries[key] = (response, sym_code, terc_gmi_full)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sym_codes=(), terc_prefixes=(), unresolved: bool = False) -> int:
+        """Usuwa wpisy dla podanych kodów SIMC, TERC zaczynających się od podanych prefiksów
+        oraz (opcjonalnie) wpisy, dla których nie udało się ustalić kodu SIMC lub TERC.
+
+        Returns:
+            Liczba usuniętych wpisów.
+        """
+        sym_codes, terc_prefixes = set(sym_codes), tuple(terc_prefixes)
+        with self._lock:
+            stale_keys = [
+                key for key, (_, sym_code, terc_gmi_full) in self._entries.items()
+                if sym_code in sym_codes
+                or (terc_prefixes and terc_gmi_full and terc_gmi_full.startswith(terc_prefixes))
+                or (unresolved and (not sym_code or not terc_gmi_full))
+            ]
+            for key in stale_keys:
+                del self._entries[key]
+        return len(stale_keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+# --- Przyrostowe aktualizacje danych (pliki zmian TERYT) ---
+
+# Kolumna pliku zmian określająca operację: D - dodanie, M - modyfikacja, U - usunięcie
+DELTA_OPERATION_COLUMN = 'TYP_KOREKTY'
+DELTA_KEYS = {
+    'TERC': ['WOJ', 'POW', 'GMI', 'RODZ'],
+    'SIMC': ['SYM'],
+    'ULIC': ['SYM', 'SYM_UL'],
+}
+# Kolejność wierszy w plikach GUS. Przy kilku pasujących wierszach (np. RODZ 3/4/5 gminy miejsko-wiejskiej
+# lub miejscowości o tej samej nazwie) wyszukiwanie bierze pierwszy, więc po nałożeniu zmian i przy
+# odtwarzaniu wydań historycznych wiersze muszą wrócić do tej kolejności
+GUS_ROW_ORDER = {
+    'TERC': ['WOJ', 'POW', 'GMI', 'RODZ'],
+    'SIMC': ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'SYM'],
+    'ULIC': ['WOJ', 'POW', 'GMI', 'RODZ_GMI', 'SYM', 'SYM_UL'],
+}
+_delta_lock = threading.Lock()
+
+def read_teryt_csv(file_path):
+    """Wczytuje plik CSV w formacie GUS (UTF-8 z fallbackiem na Latin-1), zgłaszając błędy wyjątkiem."""
+    try:
+        df = pd.read_csv(file_path, delimiter=';', encoding='utf-8', dtype=COLUMN_DTYPES, low_memory=False)
+    except UnicodeDecodeError:
+        df = pd.read_csv(file_path, delimiter=';', encoding='latin1', dtype=COLUMN_DTYPES, low_memory=False)
+        logger.warning(f"Plik {file_path} załadowano używając kodowania 'latin1' zamiast 'utf-8'.")
+    df.columns = df.columns.str.strip()
+    return df
+
+def read_delta_file(file_path, dataset):
+    """Wczytuje plik zmian TERYT (ten sam układ kolumn co pełny plik + kolumna TYP_KOREKTY)."""
+    delta_df = read_teryt_csv(file_path)
+
+    required_cols = DELTA_KEYS[dataset] + [DELTA_OPERATION_COLUMN]
+    missing_cols = [col for col in required_cols if col not in delta_df.columns]
+    if missing_cols:
+        raise ValueError(f"Brakujące kolumny w pliku zmian {dataset}: {missing_cols}")
+    # Pusta kolumna jest wczytywana jako liczby (NaN) - puste typy korekty trafiają do błędu o nieznanym typie
+    delta_df[DELTA_OPERATION_COLUMN] = delta_df[DELTA_OPERATION_COLUMN].fillna('').astype(str).str.strip().str.upper()
+    unknown_ops = set(delta_df[DELTA_OPERATION_COLUMN].unique()) - {'D', 'M', 'U'}
+    if unknown_ops:
+        raise ValueError(f"Nieznane typy korekty w pliku zmian {dataset}: {sorted(map(str, unknown_ops))}")
+    return delta_df
+
+def _row_keys(df, key_cols):
+    """Zwraca klucze wierszy jako krotki napisów (puste kody TERC, np. dla województw, jako '')."""
+    return [tuple('' if value is None or value != value else str(value) for value in row) for row in df[key_cols].itertuples(index=False, name=None)]
+
+def _differs(old, new):
+    """Porównuje wiersz po wierszu dwie kolumny o tej samej kolejności wierszy (NaN jest równe NaN)."""
+    old, new = old.to_numpy(), new.to_numpy()
+    return (old != new) & ~(pd.isna(old) & pd.isna(new))
+
+def _changed_rows(old_rows, new_rows, columns):
+    """Maska wierszy new_rows, które różnią się od old_rows (ta sama kolejność) w którejkolwiek z kolumn."""
+    changed = np.zeros(len(new_rows), dtype=bool)
+    for col in columns:
+        changed |= _differs(old_rows[col], new_rows[col])
+    return changed
+
+def _write_rows(df, rows, old_rows):
+    """Nadpisuje w miejscu wiersze df o etykietach rows (old_rows to ich obecne wartości) - tylko zmienione kolumny."""
+    for col in rows.columns:
+        if len(rows) and _differs(old_rows[col], rows[col]).any():
+            df.loc[rows.index, col] = rows[col].to_numpy()
+
+def _sorted_position(order_arrays, values):
+    """Pozycja, na którą wiersz o podanych wartościach trafiłby w tabeli posortowanej po order_arrays
+    (za wierszami o równych wartościach, jak przy stabilnym sortowaniu)."""
+    lo, hi = 0, len(order_arrays[0])
+    for column, value in zip(order_arrays, values):
+        segment = column[lo:hi]
+        lo, hi = lo + int(np.searchsorted(segment, value, 'left')), lo + int(np.searchsorted(segment, value, 'right'))
+    return hi
+
+def _splice(df, drop_positions, rows, insert_positions):
+    """Buduje tabelę bez wierszy z pozycji drop_positions, z wierszami rows wstawionymi przed podane pozycje (jedna kopia df)."""
+    inserts: Dict[int, list] = {}
+    for row, position in enumerate(insert_positions):
+        inserts.setdefault(position, []).append(row)
+    pieces, start = [], 0
+    for position in sorted(set(drop_positions) | inserts.keys()):
+        pieces.append(df.iloc[start:position])
+        if position in inserts:
+            pieces.append(rows.iloc[inserts[position]])
+        start = position + 1 if position in drop_positions else position
+    pieces.append(df.iloc[start:])
+    return pd.concat(pieces)
+
+def _rows_with_keys(df, delta_keys, key_cols):
+    """Wiersze df o kluczach z delta_keys - zawężane kolumna po kolumnie, więc pełne klucze są liczone tylko dla trafień."""
+    for position, col in enumerate(key_cols):
+        values = {key[position] for key in delta_keys}
+        column = df[col] if position == 0 else df[col].fillna('') # Pierwsza kolumna klucza nigdy nie jest pusta
+        df = df[column.isin(values)]
+    return df
+
+def _apply_rows(df, delta_df, key_cols, order_cols=None, candidate_labels=None):
+    """Nakłada wiersze pliku zmian na tabelę df.
+
+    Wiersz D/M zastępuje wiersz tabeli o tym samym kluczu (D dla istniejącego klucza działa jak M, a z kilku
+    wierszy D/M o tym samym kluczu obowiązuje ostatni). Zastępowane wiersze są nadpisywane w miejscu, więc
+    sama modyfikacja nie kopiuje tabeli - jedną kopię tworzy dopiero usunięcie lub dodanie wierszy, a zmiany
+    trafiają wtedy do nowej tabeli. Dodane wiersze dostają kolejne, nieużywane etykiety i trafiają na koniec
+    tabeli, a jeśli podano order_cols - na swoje miejsce w kolejności pliku GUS (tabela jest w tej kolejności);
+    zmodyfikowany wiersz, który zmienia tę kolejność, jest przenoszony. Etykiety wierszy nie są przenumerowywane. Zapytanie
+    wykonywane w trakcie nadpisywania może zobaczyć częściowo zmieniony wiersz - jego wynik nie zostanie
+    jednak zapamiętany, bo apply_delta unieważnia odpowiedzi dotkniętych gmin po nałożeniu zmian.
+
+    candidate_labels (np. z indeksu ulic) zawęża wyszukiwanie zastępowanych wierszy - wiersze pliku zmian
+    nieznalezione wśród nich są szukane w całej tabeli.
+
+    Returns:
+        (tabela, zastąpione/usunięte wiersze sprzed zmian, wiersze D/M, etykiety nadpisanych i dodanych
+        wierszy, etykiety usuniętych wierszy)
+    """
+    delta_keys = _row_keys(delta_df, key_cols)
+    labels_by_key: Dict[tuple, list] = {}
+    candidates = _rows_with_keys(df.loc[candidate_labels], delta_keys, key_cols) if candidate_labels is not None else df.iloc[0:0]
+    for label, key in zip(candidates.index, _row_keys(candidates, key_cols)):
+        labels_by_key.setdefault(key, []).append(label)
+    not_found = [key for key in delta_keys if key not in labels_by_key]
+    if not_found:
+        candidates = _rows_with_keys(df, not_found, key_cols)
+        for label, key in zip(candidates.index, _row_keys(candidates, key_cols)):
+            if label not in labels_by_key.get(key, []):
+                labels_by_key.setdefault(key, []).append(label)
+    matched = [label for key in dict.fromkeys(delta_keys) for label in labels_by_key.get(key, [])]
+    removed = df.loc[matched]
+
+    operations = delta_df[DELTA_OPERATION_COLUMN]
+    last_upserts = {key: row for row, (key, operation) in enumerate(zip(delta_keys, operations)) if operation != 'U'}
+    try:
+        # Typy kolumn jak w tabeli - inaczej np. RM/MZ w SIMC zmieniłyby się na liczby zmiennoprzecinkowe w całej tabeli.
+        # Kompletność kolumn wierszy D/M sprawdza apply_delta - plik z samymi usunięciami może mieć tylko klucze
+        added = delta_df.iloc[sorted(last_upserts.values())].reindex(columns=df.columns).astype(df.dtypes.to_dict())
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Wartości w pliku zmian nie pasują do typów kolumn tabeli: {e}")
+    next_label = int(df.index.max()) + 1 if len(df) else 0
+    added = added.set_axis(pd.RangeIndex(next_label, next_label + len(added)))
+
+    # Wiersze D/M z kluczem obecnym w tabeli nadpisują pierwszy wiersz o tym kluczu
+    targets = [labels_by_key.get(key, [None])[0] for key in _row_keys(added, key_cols)]
+    in_place = np.array([target is not None for target in targets], dtype=bool)
+    written = added[in_place].set_axis(pd.Index([target for target in targets if target is not None], dtype=df.index.dtype))
+    if order_cols and not written.empty:
+        moved = _changed_rows(removed.loc[written.index], written, order_cols)
+        in_place[np.flatnonzero(in_place)[moved]] = False
+        written = written[~moved]
+    inserted = added[~in_place]
+    kept = set(written.index)
+    dropped = [label for label in matched if label not in kept]
+
+    if dropped or not inserted.empty:
+        if order_cols:
+            order_arrays = [df[col].fillna('').to_numpy() for col in order_cols]
+            insert_positions = [_sorted_position(order_arrays, values) for values in _row_keys(inserted, order_cols)]
+        else:
+            insert_positions = [len(df)] * len(inserted)
+        df = _splice(df, set(df.index.get_indexer(dropped)), inserted, insert_positions)
+    _write_rows(df, written, removed.loc[written.index])
+    return df, removed, added, list(written.index) + list(inserted.index), dropped
+
+def locality_labels(locality_keys):
+    """Etykiety wierszy ulic podanych miejscowości (klucze ULIC_INDEX_KEY) według indeksu ulic."""
+    labels = [ulic_index[key] for key in set(locality_keys) if key in ulic_index]
+    return np.concatenate(labels) if labels else np.empty(0, dtype=np.int64)
+
+def refresh_streets(labels, dropped_labels=()):
+    """Ponownie wzbogaca wiersze ulic_data o podanych etykietach i aktualizuje indeks ulic tylko dla ich miejscowości.
+
+    ulic_data i ulic_data_enriched mają te same etykiety wierszy: wiersze obecne w ulic_data_enriched są
+    nadpisywane w miejscu, nowe dopisywane na koniec, a usunięte (dropped_labels) wycinane. Etykiety
+    pozostałych wierszy się nie zmieniają, więc wpisy indeksu dla niezmienionych miejscowości pozostają
+    aktualne, a indeks miejscowości jest przebudowywany tylko wtedy, gdy zmienia się zbiór lub kolejność jej ulic.
+    """
+    global ulic_data_enriched
+    enriched_df = ulic_data_enriched
+    dropped_labels = list(dropped_labels)
+    rows = ulic_data.loc[labels]
+    enriched_rows = None
+    if not rows.empty:
+        # Do wzbogacenia wystarczą wiersze SIMC dotkniętych miejscowości, nie trzeba łączyć całych tabel
+        # (bez powtórzonych kluczy miejscowości - każdy wiersz ULIC musi dać dokładnie jeden wiersz wyniku)
+        affected_simc = simc_data[simc_data['SYM'].isin(rows['SYM'].unique())].drop_duplicates(ULIC_INDEX_KEY)
+        enriched_rows = enrich_ulic_data(rows, affected_simc)
+    if enriched_rows is None or 'NAZWA_ULICY_FULL' not in enriched_rows.columns:
+        enriched_rows = enriched_df.iloc[0:0]
+    else:
+        enriched_rows = enriched_rows[enriched_df.columns].set_axis(rows.index)
+
+    existing = enriched_df.index.get_indexer(enriched_rows.index) >= 0
+    updated_rows, appended = enriched_rows[existing], enriched_rows[~existing]
+    old_rows = enriched_df.loc[updated_rows.index]
+    dropped_rows = enriched_df.loc[dropped_labels]
+    if release_dates:
+        detach_from_current('ULIC', pd.concat([old_rows, dropped_rows]), enriched_rows)
+
+    # Miejscowości, których zbiór lub kolejność ulic się zmienia (stara i nowa miejscowość przeniesionej ulicy)
+    reordered = _changed_rows(old_rows, updated_rows, GUS_ROW_ORDER['ULIC'])
+    affected_keys = set(_row_keys(pd.concat([old_rows[reordered], dropped_rows]), ULIC_INDEX_KEY))
+    affected_keys |= set(_row_keys(pd.concat([updated_rows[reordered], appended]), ULIC_INDEX_KEY))
+
+    rebuilt = bool(dropped_labels) or not appended.empty
+    if rebuilt:
+        # Nowa tabela - zapytania korzystają ze starej, dopóki nie zostanie podmieniona pod blokadą
+        enriched_df = _splice(enriched_df, set(enriched_df.index.get_indexer(dropped_labels)), appended, [len(enriched_df)] * len(appended))
+        _write_rows(enriched_df, updated_rows, old_rows)
+    new_groups = {}
+    with _ulic_lock:
+        if not rebuilt:
+            _write_rows(enriched_df, updated_rows, old_rows)
+        if affected_keys:
+            # Kolejność ulic w miejscowości jak w pliku GUS - sortowane są tylko wiersze dotkniętych miejscowości
+            # (sortowanie całej tabeli ULIC przy każdej zmianie byłoby zbyt kosztowne)
+            candidate_labels = np.concatenate([locality_labels(affected_keys), appended.index.to_numpy()])
+            candidate_labels = np.setdiff1d(candidate_labels, np.asarray(dropped_labels, dtype=candidate_labels.dtype))
+            locality_rows = enriched_df.loc[candidate_labels, GUS_ROW_ORDER['ULIC']].sort_values(GUS_ROW_ORDER['ULIC'], kind='stable')
+            new_groups = build_ulic_index(locality_rows)
+        ulic_data_enriched = enriched_df
+        ulic_index.update(new_groups)
+        for locality_key in affected_keys - new_groups.keys():
+            ulic_index.pop(locality_key, None)
+
+def apply_delta(dataset, delta_df):
+    """Nakłada plik zmian na załadowane dane, aktualizując tylko zmienione wiersze, indeksy i wpisy pamięci podręcznej.
+
+    Args:
+        dataset: 'TERC', 'SIMC' lub 'ULIC'
+        delta_df: Wiersze pliku zmian (wynik read_delta_file)
+
+    Returns:
+        Słownik z podsumowaniem zmian.
+    """
+    global terc_data, simc_data, ulic_data, name_indexes, dataset_version, terc_simc_version
+    with _delta_lock:
+        current = {'TERC': terc_data, 'SIMC': simc_data, 'ULIC': ulic_data}[dataset]
+        if current is None or ulic_data_enriched is None:
+            raise RuntimeError(f"Dane {dataset} nie są załadowane - nie można nałożyć pliku zmian.")
+
+        # Dodawane i modyfikowane wiersze zastępują całe wiersze tabeli, więc muszą mieć wszystkie jej kolumny
+        missing_cols = [col for col in current.columns if col not in delta_df.columns]
+        if missing_cols and (delta_df[DELTA_OPERATION_COLUMN] != 'U').any():
+            raise ValueError(f"Wiersze D/M pliku zmian {dataset} nie zawierają kolumn tabeli: {missing_cols}")
+
+        # Kolejność TERC i SIMC decyduje o wyniku wyszukiwania, a kolejność ulic porządkuje refresh_streets
+        order_cols = GUS_ROW_ORDER[dataset] if dataset != 'ULIC' else None
+        # Ulice zmienianych miejscowości są w indeksie ulic (ulic_data ma te same etykiety co ulic_data_enriched),
+        # więc zmiana ulicy nie przegląda całej tabeli ULIC
+        candidate_labels = locality_labels(_row_keys(delta_df, ULIC_INDEX_KEY)) if dataset == 'ULIC' and all(col in delta_df.columns for col in ULIC_INDEX_KEY) else None
+        updated, removed, added, written_labels, dropped_labels = _apply_rows(current, delta_df, DELTA_KEYS[dataset], order_cols, candidate_labels)
+        operations = delta_df[DELTA_OPERATION_COLUMN].value_counts()
+        missing = len(delta_df[delta_df[DELTA_OPERATION_COLUMN] != 'D']) - len(removed)
+        if missing > 0:
+            logger.warning(f"Plik zmian {dataset}: {missing} modyfikowanych/usuwanych wierszy nie występuje w załadowanych danych.")
+
+        if order_cols:
+            # TERC i SIMC mają etykiety 0..n-1, więc etykiety po _apply_rows to dawne pozycje wierszy - indeks nazw
+            # jest przesuwany na nowe pozycje zamiast budowany od nowa
+            labels = updated.index
+            if updated is not current:
+                updated = updated.reset_index(drop=True)
+            name_index = name_indexes[dataset].updated(updated, labels, written_labels)
+
+        changed = pd.concat([removed, added])
+        sym_codes = set()
+        if dataset != 'ULIC' and release_dates:
+            detach_from_current(dataset, removed, added)
+        if dataset == 'TERC':
+            terc_data = dataframes[TERC_FILENAME] = updated
+            name_indexes = {**name_indexes, 'TERC': name_index}
+            # Zmiana nazwy województwa/powiatu/gminy wpływa na wszystkie miejscowości pod nią
+            terc_prefixes = {f"{row.WOJ}{row.POW if pd.notna(row.POW) else ''}{row.GMI if pd.notna(row.GMI) else ''}" for row in changed.itertuples()}
+        else:
+            sym_codes = set(changed['SYM'])
+            if dataset == 'SIMC':
+                simc_data = dataframes[SIMC_FILENAME] = updated
+                name_indexes = {**name_indexes, 'SIMC': name_index}
+                # Miejscowość mogła zmienić gminę lub nazwę - unieważnij też odpowiedzi dla jej gmin
+                terc_prefixes = {f"{row.WOJ}{row.POW}{row.GMI}{row.RODZ_GMI}" for row in changed.itertuples()}
+                # Wzbogacenie łączy ULIC z SIMC po pełnym kluczu miejscowości, więc zmiana wiersza SIMC dotyczy tylko ulic
+                # z kluczem jego starej lub nowej wersji
+                refresh_streets(locality_labels(_row_keys(changed, ULIC_INDEX_KEY)))
+            else:
+                ulic_data = dataframes[ULIC_FILENAME] = updated
+                terc_prefixes = set()
+                refresh_streets(written_labels, dropped_labels)
+
+        # Nowa wersja danych dopiero po podmianie tabel - wyniki liczone wcześniej nie trafią już do pamięci
+        # podręcznej, a te zapisane w trakcie podmiany zostaną usunięte poniżej
+        dataset_version += 1
+        if dataset != 'ULIC':
+            terc_simc_version += 1
+        invalidated = response_cache.invalidate(sym_codes=sym_codes, terc_prefixes=terc_prefixes, unresolved=dataset != 'ULIC')
+
+    summary = {
+        "dataset": dataset,
+        "added": int(operations.get('D', 0)),
+        "modified": int(operations.get('M', 0)),
+        "deleted": int(operations.get('U', 0)),
+        "invalidated_cache_entries": invalidated,
+        "dataset_version": dataset_version,
+    }
+    logger.info(f"Nałożono plik zmian {dataset}: {summary}")
+    return summary
+
+# --- Historyczne wydania TERYT (zapytania 'as_of') ---
+
+# Wersjonowane tabele historycznych wydań: każda wersja wiersza jest przechowywana raz, razem z zakresem
+# numerów wydań [_OD, _DO], w których występuje bez zmian. Wiersz niezmieniony przez N kolejnych wydań
+# zajmuje więc pamięć tylko raz, a nie N razy. Wiersze, które bez zmian trwają aż do bieżącego wydania,
+# nie są przechowywane w tabelach wersji wcale - wydania historyczne biorą je z bieżących danych
+# (current_since), więc bieżące wydanie nie jest drugą pełną kopią danych.
+release_dates: List[str] = [] # Daty historycznych wydań rosnąco; pozycja na liście to numer wydania
+current_release_date: Optional[str] = None
+terc_history: Optional[pd.DataFrame] = None
+simc_history: Optional[pd.DataFrame] = None
+ulic_history: Optional[pd.DataFrame] = None # Wzbogacone wiersze ULIC (nazwy miejscowości z SIMC danego wydania)
+ulic_history_index: Dict[tuple, Any] = {}
+release_row_counts: Dict[str, int] = {} # Łączna liczba wierszy wydań historycznych (bez deduplikacji)
+# Wiersze bieżących danych współdzielone z wydaniami historycznymi: zbiór -> (posortowane skróty wierszy,
+# numer najstarszego wydania, od którego wiersz występuje bez zmian, kolumny użyte do liczenia skrótu)
+current_since: Dict[str, tuple] = {}
+VERSION_COLUMNS = ['_OD', '_DO', '_HASH']
+
+def _row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+def _content_columns(df):
+    """Kolumny porównywane między wydaniami (bez STAN_NA - w plikach GUS to data całego wydania)."""
+    return [col for col in df.columns if col != 'STAN_NA' and col not in VERSION_COLUMNS]
+
+def add_release_version(history_df, release_df, release_idx):
+    """Dołącza kolejne wydanie do wersjonowanej tabeli.
+
+    Wiersze identyczne z wierszami poprzedniego wydania tylko wydłużają ich zakres ważności, a nowe
+    lub zmienione wiersze są dopisywane jako nowe wersje. STAN_NA nie jest porównywany (w plikach GUS
+    to data całego wydania) - przy odtwarzaniu wydania jest ustawiany na jego datę.
+    """
+    row_hashes = _row_hashes(release_df, _content_columns(release_df))
+    new_rows = np.ones(len(release_df), dtype=bool)
+    if history_df is not None:
+        history_hashes = history_df['_HASH'].to_numpy()
+        open_mask = (history_df['_DO'] == release_idx - 1).to_numpy()
+        history_df.loc[open_mask & np.isin(history_hashes, row_hashes), '_DO'] = release_idx
+        new_rows = ~np.isin(row_hashes, history_hashes[open_mask])
+    versions = release_df[new_rows].assign(_OD=release_idx, _DO=release_idx, _HASH=row_hashes[new_rows])
+    return versions.reset_index(drop=True) if history_df is None else pd.concat([history_df, versions], ignore_index=True)
+
+def share_with_current(history_df, current_df, last_idx):
+    """Usuwa z tabeli wersji wiersze, które bez zmian trwają od ostatniego wydania historycznego do bieżących danych.
+
+    Returns:
+        (tabela wersji bez tych wierszy, wpis current_since dla tego zbioru)
+    """
+    columns = _content_columns(history_df) if history_df is not None else []
+    if history_df is None or current_df is None or not all(col in current_df.columns for col in columns):
+        return history_df, (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64), columns)
+    shared = (history_df['_DO'] == last_idx).to_numpy() & np.isin(history_df['_HASH'].to_numpy(), _row_hashes(current_df, columns))
+    since = history_df.loc[shared, ['_HASH', '_OD']].drop_duplicates('_HASH').sort_values('_HASH')
+    return history_df[~shared].reset_index(drop=True), (since['_HASH'].to_numpy(), since['_OD'].to_numpy(), columns)
+
+def _shared_since(name, row_hashes):
+    """Dla skrótów bieżących wierszy zwraca numer wydania, od którego występują bez zmian (len(release_dates) - tylko bieżące)."""
+    hashes, since, _ = current_since[name]
+    if not len(hashes):
+        return np.full(len(row_hashes), len(release_dates))
+    positions = np.minimum(np.searchsorted(hashes, row_hashes), len(hashes) - 1)
+    return np.where(hashes[positions] == row_hashes, since[positions], len(release_dates))
+
+def detach_from_current(name, old_rows, new_rows):
+    """Przenosi do tabeli wersji wiersze, które plik zmian usuwa z bieżących danych, a które występują też
+    w wydaniach historycznych - te wydania muszą je nadal zawierać."""
+    global terc_history, simc_history, ulic_history, ulic_history_index
+    if name not in current_since or not len(current_since[name][0]) or old_rows.empty:
+        return
+    hashes, since, columns = current_since[name]
+    old_hashes = _row_hashes(old_rows, columns)
+    # Wiersze odtworzone bez zmian (np. ponownie wzbogacone ulice tej samej miejscowości) pozostają współdzielone
+    if not new_rows.empty and all(col in new_rows.columns for col in columns):
+        removed = ~np.isin(old_hashes, _row_hashes(new_rows, columns))
+    else:
+        removed = np.ones(len(old_rows), dtype=bool)
+    old_since = _shared_since(name, old_hashes)
+    moved_mask = removed & (old_since < len(release_dates))
+    if not moved_mask.any():
+        return
+    history_df = {'TERC': terc_history, 'SIMC': simc_history, 'ULIC': ulic_history}[name]
+    moved = old_rows.loc[moved_mask, [col for col in history_df.columns if col not in VERSION_COLUMNS]].assign(
+        _OD=old_since[moved_mask], _DO=len(release_dates) - 1, _HASH=old_hashes[moved_mask])
+    next_label = len(history_df)
+    history_df = pd.concat([history_df, moved.set_axis(pd.RangeIndex(next_label, next_label + len(moved)))])
+    keep = ~np.isin(hashes, old_hashes[moved_mask])
+    current_since[name] = (hashes[keep], since[keep], columns)
+    if name == 'TERC':
+        terc_history = history_df
+    elif name == 'SIMC':
+        simc_history = history_df
+    else:
+        # Najpierw tabela, potem indeks - zapytanie nie może dostać etykiet, których jeszcze nie ma w tabeli
+        ulic_history = history_df
+        new_index = dict(ulic_history_index)
+        for locality_key, labels in build_ulic_index(history_df.loc[next_label:]).items():
+            new_index[locality_key] = np.concatenate([new_index[locality_key], labels]) if locality_key in new_index else labels
+        ulic_history_index = new_index
+
+def load_historical_releases():
+    """Ładuje historyczne wydania TERYT (HISTORICAL_RELEASES) do wersjonowanych tabel."""
+    global release_dates, current_release_date, terc_history, simc_history, ulic_history, ulic_history_index, release_row_counts, get_release_view
+    stage = StartupStage('historical_releases')
+    current_release_date = CURRENT_RELEASE_DATE
+    if not current_release_date:
+        filename_date = re.search(r'\d{4}-\d{2}-\d{2}', TERC_FILENAME)
+        if filename_date:
+            current_release_date = filename_date.group(0)
+        elif terc_data is not None and 'STAN_NA' in terc_data.columns:
+            current_release_date = terc_data['STAN_NA'].max()
+    if not current_release_date:
+        logger.warning("Nie udało się ustalić daty bieżącego wydania TERYT - zapytania 'as_of' użyją tylko wydań historycznych.")
+
+    dates, histories, row_counts = [], {'TERC': None, 'SIMC': None, 'ULIC': None}, {'TERC': 0, 'SIMC': 0, 'ULIC': 0}
+    for release_date in sorted(set(HISTORICAL_RELEASES)):
+        if current_release_date and release_date >= current_release_date:
+            logger.warning(f"Pomijam wydanie historyczne {release_date} - nie jest starsze niż bieżące wydanie {current_release_date}.")
+            continue
+        try:
+            terc_df = read_teryt_csv(os.path.join(DATA_DIR, TERC_RELEASE_PATTERN.format(date=release_date)))
+            simc_df = read_teryt_csv(os.path.join(DATA_DIR, SIMC_RELEASE_PATTERN.format(date=release_date)))
+            ulic_df = enrich_ulic_data(read_teryt_csv(os.path.join(DATA_DIR, ULIC_RELEASE_PATTERN.format(date=release_date))), simc_df)
+        except Exception as e:
+            logger.error(f"Nie udało się załadować wydania historycznego {release_date}: {e}")
+            continue
+        if ulic_df is None or 'NAZWA_ULICY_FULL' not in ulic_df.columns:
+            logger.error(f"Nie udało się wzbogacić danych ULIC wydania historycznego {release_date}.")
+            continue
+
+        release_idx = len(dates)
+        for name, df in [('TERC', terc_df), ('SIMC', simc_df), ('ULIC', ulic_df)]:
+            histories[name] = add_release_version(histories[name], df, release_idx)
+            row_counts[name] += len(df)
+        dates.append(release_date)
+        logger.info(f"Załadowano wydanie historyczne TERYT {release_date}.")
+
+    current = {'TERC': terc_data, 'SIMC': simc_data, 'ULIC': ulic_data_enriched}
+    for name in histories:
+        histories[name], current_since[name] = share_with_current(histories[name], current[name], len(dates) - 1)
+    release_dates, release_row_counts = dates, row_counts
+    terc_history, simc_history, ulic_history = histories['TERC'], histories['SIMC'], histories['ULIC']
+    ulic_history_index = build_ulic_index(ulic_history)
+    get_release_view = functools.lru_cache(maxsize=RELEASE_VIEW_CACHE_SIZE or max(len(dates), 1))(build_release_view)
+    stage.done()
+    if dates:
+        stored = {name: len(df) for name, df in histories.items()}
+        shared = {name: len(entry[0]) for name, entry in current_since.items()}
+        logger.info(f"Załadowano {len(dates)} wydań historycznych. Wiersze bez deduplikacji (bez bieżącego wydania): {row_counts}, "
+                    f"przechowywane wersje historyczne: {stored}, wiersze współdzielone z bieżącymi danymi: {shared}.")
+
+def _rows_in_release(name, history_df, current_df, release_idx):
+    """Wiersze wydania release_idx: wersje z tabeli historycznej oraz bieżące wiersze, które już wtedy występowały."""
+    versions = history_df[(history_df['_OD'] <= release_idx) & (history_df['_DO'] >= release_idx)]
+    columns = [col for col in history_df.columns if col not in VERSION_COLUMNS]
+    rows = versions[columns]
+    if current_df is not None and len(current_since[name][0]):
+        shared = current_df[_shared_since(name, _row_hashes(current_df, current_since[name][2])) <= release_idx]
+        rows = pd.concat([rows, shared[columns]], ignore_index=True)
+    return rows.assign(STAN_NA=release_dates[release_idx])
+
+class TerytRelease:
+    """Dane jednego historycznego wydania TERYT odtworzone z wersjonowanych tabel.
+
+    Tabele TERC i SIMC są odtwarzane w całości (są małe), a ulice są wybierane z wersjonowanej
+    tabeli ULIC i bieżących danych dopiero przy zapytaniu, tylko dla jednej miejscowości. Wiersze
+    pochodzą z dwóch źródeł, a wersje dopisane w późniejszych wydaniach trafiają na koniec tabel,
+    więc wiersze są sortowane po kodach jednostek, jak w plikach GUS.
+    """
+
+    def __init__(self, release_date: str, release_idx: int):
+        self.release_date = release_date
+        self.release_idx = release_idx
+        self.terc = _rows_in_release('TERC', terc_history, terc_data, release_idx).sort_values(GUS_ROW_ORDER['TERC'], kind='stable', na_position='first')
+        self.simc = _rows_in_release('SIMC', simc_history, simc_data, release_idx).sort_values(GUS_ROW_ORDER['SIMC'], kind='stable')
+        self.name_indexes = build_name_indexes(self.terc, self.simc)
+
+    def get_streets(self, locality_key):
+        history_df, history_labels = ulic_history, ulic_history_index.get(locality_key)
+        with _ulic_lock:
+            current_labels = ulic_index.get(locality_key)
+            current_rows = ulic_data_enriched.loc[current_labels] if current_labels is not None else None
+        history_rows = history_df.loc[history_labels] if history_labels is not None else history_df.iloc[0:0]
+        return _rows_in_release('ULIC', history_rows, current_rows, self.release_idx).sort_values('SYM_UL', kind='stable')
+
+def build_release_view(release_idx: int, version: int) -> TerytRelease:
+    """Widok wydania dla danej wersji bieżących danych TERC/SIMC (terc_simc_version) - pliki zmian TERC/SIMC
+    zmieniają bieżące dane, z których widok korzysta."""
+    return TerytRelease(release_dates[release_idx], release_idx)
+
+# Pamięć podręczna widoków - rozmiar ustala load_historical_releases (domyślnie po jednym widoku na wydanie)
+get_release_view = functools.lru_cache(maxsize=RELEASE_VIEW_CACHE_SIZE or 1)(build_release_view)
+
+def resolve_release(as_of: date) -> Optional[TerytRelease]:
+    """Zwraca wydanie TERYT obowiązujące w dniu as_of (None oznacza bieżące dane)."""
+    as_of_str = as_of.isoformat()
+    if current_release_date and as_of_str >= current_release_date:
+        return None
+    release_idx = bisect.bisect_right(release_dates, as_of_str) - 1
+    if release_idx < 0:
+        raise HTTPException(status_code=404, detail=f"Brak załadowanego wydania TERYT obowiązującego w dniu {as_of_str}.")
+    return get_release_view(release_idx, terc_simc_version)
+
+# --- Rozgrzewanie i gotowość ---
+
+# Liczba zapytań o każdy kod pocztowy (wczytywana z ACCESS_STATS_FILE, zapisywana okresowo i przy zamknięciu)
+postal_code_access: Counter = Counter()
+warmup_state: Dict[str, Any] = {"status": "pending", "postal_codes": 0, "warmed_postal_codes": 0, "lookups": 0, "failed_lookups": 0}
+
+def record_postal_code_access(postal_code):
+    """Zlicza zapytanie o kod pocztowy (tylko istniejące kody, aby błędne dane wejściowe nie rozdymały statystyk)."""
+    if postal_code in kody_index:
+        postal_code_access[postal_code] += 1
+
+def load_access_stats():
+    """Wczytuje zapisane statystyki dostępu do kodów pocztowych (jeśli ACCESS_STATS_FILE jest ustawiony)."""
+    if not ACCESS_STATS_FILE or not os.path.isfile(ACCESS_STATS_FILE):
+        return
+    try:
+        with open(ACCESS_STATS_FILE, encoding='utf-8') as f:
+            postal_code_access.update({str(pc): int(count) for pc, count in json.load(f).items()})
+        logger.info(f"Wczytano statystyki dostępu dla {len(postal_code_access)} kodów pocztowych z {ACCESS_STATS_FILE}.")
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning(f"Nie udało się wczytać statystyk dostępu z {ACCESS_STATS_FILE}: {e}")
+
+def save_access_stats(stats=None):
+    """Zapisuje statystyki dostępu (najczęstsze ACCESS_STATS_MAX_ENTRIES kodów) do ACCESS_STATS_FILE."""
+    stats = postal_code_access if stats is None else stats
+    if not ACCESS_STATS_FILE or not stats:
+        return
+    tmp_path = f"{ACCESS_STATS_FILE}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(stats.most_common(ACCESS_STATS_MAX_ENTRIES)), f)
+        os.replace(tmp_path, ACCESS_STATS_FILE) # Podmiana atomowa - przerwany zapis nie psuje poprzedniego pliku
+    except OSError as e:
+        logger.warning(f"Nie udało się zapisać statystyk dostępu do {ACCESS_STATS_FILE}: {e}")
+
+async def flush_access_stats():
+    """Zapisuje statystyki dostępu co ACCESS_STATS_FLUSH_SECONDS (zadanie w tle do zamknięcia aplikacji)."""
+    while True:
+        await asyncio.sleep(ACCESS_STATS_FLUSH_SECONDS)
+        # Liczniki zwiększają endpointy w pętli zdarzeń, więc kopia nie zmieni się w trakcie zapisu w puli wątków
+        await run_in_threadpool(save_access_stats, Counter(postal_code_access))
+
+def select_warmup_postal_codes():
+    """Wybiera kody do rozgrzania: WARMUP_POSTAL_CODES oraz WARMUP_TOP_N najczęściej odpytywanych.
+
+    Gdy statystyk dostępu brakuje (lub jest ich za mało), listę uzupełniają kody z największą liczbą
+    wierszy w pliku kodów pocztowych, czyli kody dużych miast, dla których pierwsze zapytania są najdroższe.
+    """
+    ranked = [postal_code for postal_code, _ in postal_code_access.most_common()]
+    ranked += sorted(kody_index, key=lambda postal_code: len(kody_index[postal_code]), reverse=True)
+    selected = list(dict.fromkeys(WARMUP_POSTAL_CODES))
+    selected += [postal_code for postal_code in dict.fromkeys(ranked) if postal_code not in selected][:WARMUP_TOP_N]
+    return [postal_code for postal_code in selected if postal_code in kody_index]
+
+async def warm_up():
+    """Wypełnia pamięć podręczną odpowiedzi dla wybranych kodów pocztowych przed zgłoszeniem gotowości."""
+    stage = StartupStage('warmup')
+    warmup_state["status"] = "running"
+    # Metryki etapów i pamięci podręcznej z rozgrzewania nie mieszają się z ruchem zapytań
+    _background_endpoint.set('warmup')
+    try:
+        if release_dates:
+            # Odtworzenie najnowszego wydania historycznego (TERC/SIMC) też jest kosztowne przy pierwszym zapytaniu
+            await run_in_threadpool(get_release_view, len(release_dates) - 1, terc_simc_version)
+        postal_codes = select_warmup_postal_codes()
+        warmup_state["postal_codes"] = len(postal_codes)
+        deadline = time.monotonic() + WARMUP_MAX_SECONDS
+        for postal_code in postal_codes:
+            if time.monotonic() > deadline:
+                logger.warning(f"Przekroczono WARMUP_MAX_SECONDS={WARMUP_MAX_SECONDS} - rozgrzano {warmup_state['warmed_postal_codes']} z {len(postal_codes)} kodów.")
+                break
+            lookups = [(get_postal_code_details_cached, (postal_code, None))]
+            for locality in get_postal_code_rows(postal_code)['MIEJSCOWOŚĆ_CLEAN'].dropna().unique():
+                lookups += [(get_postal_code_details_cached, (postal_code, locality)),
+                            (get_address_teryt_codes_cached, (postal_code, locality, None))]
+            for lookup, args in lookups:
+                try:
+                    await lookup(*args)
+                    warmup_state["lookups"] += 1
+                except HTTPException:
+                    warmup_state["failed_lookups"] += 1
+            warmup_state["warmed_postal_codes"] += 1
+        warmup_state["status"] = "done"
+    except Exception as e:
+        # Rozgrzewanie tylko przyspiesza pierwsze zapytania - błąd nie może blokować gotowości
+        logger.error(f"Błąd podczas rozgrzewania: {e}")
+        warmup_state["status"] = "failed"
+    stage.done()
+    logger.info(f"Zakończono rozgrzewanie: {warmup_state}. Profil startu: {startup_profile}")
+
+def data_loaded():
+    """Sprawdza, czy kluczowe DataFrame'y zostały załadowane."""
+    return all(df is not None for df in [terc_data, simc_data, ulic_data_enriched, kody_pocztowe_data])
+
+def is_ready():
+    """Gotowość do obsługi ruchu: dane załadowane, a rozgrzewanie zakończone (lub wyłączone)."""
+    return data_loaded() and warmup_state["status"] in ("done", "failed", "disabled")
+
 # --- Pydantic Models (Definicje struktur danych dla API) ---
 
 class LocalityListResponse(BaseModel):
@@ -471,8 +1716,22 @@ async def lifespan(app: FastAPI):
     """Funkcja uruchamiana przy starcie i zamknięciu aplikacji FastAPI."""
     # Kod uruchamiany przy starcie
     load_data_on_startup()
+    load_historical_releases()
+    load_access_stats()
+    # Rozgrzewanie działa w tle - /health/live odpowiada od razu, a /health/ready dopiero po jego zakończeniu
+    warmup_task = None
+    if WARMUP_ENABLED and data_loaded():
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        warmup_state["status"] = "disabled"
+        logger.info(f"Rozgrzewanie wyłączone. Profil startu: {startup_profile}")
+    flush_task = asyncio.create_task(flush_access_stats()) if ACCESS_STATS_FILE and ACCESS_STATS_FLUSH_SECONDS > 0 else None
     yield
-    # Kod uruchamiany przy zamknięciu (jeśli potrzebny)
+    # Kod uruchamiany przy zamknięciu
+    for task in (warmup_task, flush_task):
+        if task is not None and not task.done():
+            task.cancel()
+    save_access_stats()
 
 app = FastAPI(
     title="API Teryt",
@@ -480,6 +1739,7 @@ app = FastAPI(
     version="1.5.0",
     lifespan=lifespan # Dodane użycie nowego systemu lifespan
 )
+app.add_middleware(MetricsMiddleware)
 
 # --- API Endpoints ---
 
@@ -487,10 +1747,91 @@ app = FastAPI(
 async def health_check():
     """Zwraca status OK, jeśli API działa i podstawowe dane są załadowane."""
     # Sprawdź, czy kluczowe DataFrame'y zostały załadowane
-    data_loaded = all(df is not None for df in [terc_data, simc_data, ulic_data_enriched, kody_pocztowe_data])
-    status = "OK" if data_loaded else "WARN"
-    detail = "Wszystkie wymagane dane załadowane." if data_loaded else "Nie wszystkie wymagane dane zostały załadowane. Sprawdź logi."
-    return {"status": status, "data_loaded": data_loaded, "detail": detail}
+    loaded = data_loaded()
+    status = "OK" if loaded else "WARN"
+    detail = "Wszystkie wymagane dane załadowane." if loaded else "Nie wszystkie wymagane dane zostały załadowane. Sprawdź logi."
+    return {"status": status, "data_loaded": loaded, "ready": is_ready(), "detail": detail}
+
+@app.get("/health/live", summary="Sprawdza, czy proces API działa (liveness)", tags=["Status"])
+async def liveness_check():
+    """Zawsze zwraca 200, jeśli proces obsługuje zapytania - niezależnie od stanu danych."""
+    return {"status": "alive"}
+
+@app.get("/health/ready", summary="Sprawdza, czy API jest gotowe do obsługi ruchu (readiness)", tags=["Status"])
+async def readiness_check():
+    """Zwraca 200 dopiero po załadowaniu danych i zakończeniu rozgrzewania, wcześniej 503."""
+    if is_ready():
+        return {"status": "ready", "warmup": warmup_state}
+    status = "loading" if not data_loaded() else "warming_up"
+    return JSONResponse(status_code=503, content={"status": status, "warmup": warmup_state})
+
+@app.get("/stats/startup", summary="Profil startu aplikacji", tags=["Status"])
+async def startup_stats():
+    """Zwraca czas i zużycie pamięci każdego etapu startu (ładowanie, wzbogacanie, indeksy, rozgrzewanie)."""
+    return {"ready": is_ready(), "warmup": warmup_state, "stages": startup_profile}
+
+@app.get("/metrics", summary="Metryki w formacie Prometheusa", tags=["Status"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Zwraca histogramy czasu zapytań i etapów, liczniki pamięci podręcznej, czasy ładowania i rozmiary danych."""
+    collect_runtime_metrics()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats/single_flight", summary="Statystyki łączenia równoległych zapytań", tags=["Status"])
+async def single_flight_stats():
+    """Zwraca liczbę wykonanych obliczeń oraz liczbę zapytań, które współdzieliły wynik trwającego obliczenia."""
+    return {"dataset_version": dataset_version, **single_flight.stats()}
+
+@app.get("/stats/cache", summary="Statystyki pamięci podręcznej odpowiedzi", tags=["Status"])
+async def response_cache_stats():
+    """Zwraca rozmiar pamięci podręcznej odpowiedzi oraz liczbę trafień i chybień."""
+    return {"dataset_version": dataset_version, **response_cache.stats()}
+
+@app.get("/stats/releases", summary="Załadowane wydania TERYT", tags=["Status"])
+async def releases_stats():
+    """Zwraca daty załadowanych wydań oraz liczbę przechowywanych wierszy w porównaniu z pełnymi kopiami (łącznie z bieżącym wydaniem)."""
+    history = {'TERC': terc_history, 'SIMC': simc_history, 'ULIC': ulic_history}
+    current = {'TERC': terc_data, 'SIMC': simc_data, 'ULIC': ulic_data_enriched}
+    historical_versions = {name: (len(df) if df is not None else 0) for name, df in history.items()}
+    current_rows = {name: (len(df) if df is not None else 0) for name, df in current.items()}
+    return {
+        "current_release": current_release_date,
+        "historical_releases": release_dates,
+        "rows_without_deduplication": {name: release_row_counts.get(name, 0) + current_rows[name] for name in history},
+        "stored_rows": {name: historical_versions[name] + current_rows[name] for name in history},
+        "current_rows": current_rows,
+        "historical_only_row_versions": historical_versions,
+    }
+
+@app.post(
+    "/data/deltas/{dataset}",
+    summary="Nakłada plik zmian TERYT na załadowane dane",
+    tags=["Data"],
+    dependencies=[Depends(verify_token)]
+)
+async def apply_delta_file(
+    dataset: Literal['TERC', 'SIMC', 'ULIC'] = Path(..., description="Zbiór, którego dotyczy plik zmian"),
+    filename: str = Query(..., description=f"Nazwa pliku zmian w katalogu danych ({DATA_DIR})", min_length=1)
+):
+    """
+    Wczytuje plik zmian (układ kolumn jak w pełnym pliku + kolumna TYP_KOREKTY: D - dodanie,
+    M - modyfikacja, U - usunięcie) i nakłada go na załadowane dane. Przeliczane są tylko zmienione
+    wiersze, indeks ulic dotkniętych miejscowości oraz zależne od nich wpisy pamięci podręcznej.
+    """
+    file_path = os.path.join(DATA_DIR, os.path.basename(filename)) # Tylko pliki z katalogu danych
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"Plik zmian '{filename}' nie znaleziony w {DATA_DIR}.")
+    start = time.perf_counter()
+    try:
+        delta_df = await run_in_threadpool(read_delta_file, file_path, dataset)
+        summary = await run_in_threadpool(apply_delta, dataset, delta_df)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy plik zmian: {e}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    duration = time.perf_counter() - start
+    metrics.observe('teryt_delta_apply_duration_seconds', duration, (('dataset', dataset),))
+    summary["duration_ms"] = round(duration * 1000, 2)
+    return summary
 
 @app.get(
     "/postal_codes/{postal_code}/localities",
@@ -499,6 +1840,7 @@ async def health_check():
     response_model=LocalityListResponse,
     dependencies=[Depends(verify_token)]
 )
+@timed_endpoint
 async def get_localities_by_postal_code(
     postal_code: str = Path(..., description="Kod pocztowy w formacie XX-XXX", pattern=r"^\d{2}-\d{3}$")
 ):
@@ -512,15 +1854,15 @@ async def get_localities_by_postal_code(
          raise HTTPException(status_code=500, detail="Błąd wewnętrzny serwera: Brak przetworzonej kolumny miejscowości.")
 
     postal_code = postal_code.strip()
-    # Użyj 'PNA' do filtrowania
-    pasujace_df = kody_pocztowe_data[kody_pocztowe_data['PNA'] == postal_code]
+    record_postal_code_access(postal_code)
+    pasujace_df = get_postal_code_rows(postal_code)
 
     if pasujace_df.empty:
         raise HTTPException(status_code=404, detail=f"Nie znaleziono miejscowości dla kodu pocztowego: {postal_code}")
 
     # Użyj 'MIEJSCOWOŚĆ_CLEAN' do uzyskania listy
     lista_miejscowosci = sorted(pasujace_df['MIEJSCOWOŚĆ_CLEAN'].unique())
-    logger.info(f"Znaleziono {len(lista_miejscowosci)} miejscowości dla kodu {postal_code}: {', '.join(lista_miejscowosci)}")
+    log_event(logging.INFO, 'localities_lookup', "Znaleziono %d miejscowości dla kodu %s", len(lista_miejscowosci), postal_code, postal_code=postal_code)
     return LocalityListResponse(postal_code=postal_code, localities=lista_miejscowosci)
 
 
@@ -531,23 +1873,53 @@ async def get_localities_by_postal_code(
     response_model=PostalCodeDetailsResponse, 
     dependencies=[Depends(verify_token)]
 )
+@timed_endpoint
 async def lookup_postal_code_details(
     postal_code: str = Path(..., description="Kod pocztowy w formacie XX-XXX", pattern=r"^\d{2}-\d{3}$"),
-    locality: Optional[str] = Query(None, description="Opcjonalnie: Nazwa miejscowości (miasto/wieś) do zawężenia wyników (jeśli kod pocztowy obejmuje wiele miejscowości)")
+    locality: Optional[str] = Query(None, description="Opcjonalnie: Nazwa miejscowości (miasto/wieś) do zawężenia wyników (jeśli kod pocztowy obejmuje wiele miejscowości)"),
+    as_of: Optional[date] = Query(None, description="Opcjonalnie: data (RRRR-MM-DD), na którą mają obowiązywać dane TERYT - używa wydania historycznego zamiast bieżącego")
 ):
     """
     Na podstawie kodu pocztowego zwraca szczegółowe dane TERYT (TERC, SIMC, ULIC).
     Jeśli kod pocztowy obejmuje wiele miejscowości, *musisz* podać parametr 'locality',
     aby uzyskać szczegóły dla konkretnej z nich. W przeciwnym razie, jeśli tylko jedna miejscowość
     pasuje do kodu, jej szczegóły są zwracane od razu.
+    Parametr 'as_of' pozwala odpytać stan danych TERC/SIMC/ULIC z historycznego wydania.
     """
+    postal_code = postal_code.strip()
+    record_postal_code_access(postal_code)
+    release = resolve_release(as_of) if as_of else None
+    release_date = release.release_date if release else None
+    response = await get_postal_code_details_cached(postal_code, locality, release)
+    # Wynik mógł zostać policzony dla innego zapytania różniącego się tylko zapisem miejscowości
+    if response.query.get("locality_input") != locality or as_of:
+        query = {**response.query, "locality_input": locality}
+        if as_of:
+            query.update({"as_of": as_of.isoformat(), "release": release_date or current_release_date})
+        response = response.model_copy(update={"query": query})
+    return response
+
+
+async def get_postal_code_details_cached(postal_code: str, locality: Optional[str], release=None) -> PostalCodeDetailsResponse:
+    """Zwraca odpowiedź endpointu szczegółów z pamięci podręcznej albo liczy ją (raz dla równoległych zapytań)."""
+    key = ("details", postal_code, locality.strip().lower() if locality else None, release.release_date if release else None)
+    response = response_cache.get(key)
+    record_cache_result("details", response is not None)
+    if response is None:
+        version = dataset_version
+        response = await single_flight.do(key + (version,), build_postal_code_details, postal_code, locality, release)
+        response_cache.put(key, response, version, response.teryt_codes.get("simc"), response.teryt_codes.get("terc_municipality"))
+    return response
+
+
+def build_postal_code_details(postal_code: str, locality: Optional[str], release=None) -> PostalCodeDetailsResponse:
+    """Wyszukuje dane TERYT dla kodu pocztowego (i opcjonalnie miejscowości) i buduje odpowiedź endpointu szczegółów."""
     if kody_pocztowe_data is None:
         raise HTTPException(status_code=503, detail="Dane kodów pocztowych nie są załadowane.")
     if 'MIEJSCOWOŚĆ_CLEAN' not in kody_pocztowe_data.columns:
         raise HTTPException(status_code=500, detail="Błąd wewnętrzny serwera: Brak przetworzonej kolumny miejscowości.")
 
-    postal_code = postal_code.strip()
-    pasujace_miejscowosci_df = kody_pocztowe_data[kody_pocztowe_data['PNA'] == postal_code]
+    pasujace_miejscowosci_df = get_postal_code_rows(postal_code)
 
     if pasujace_miejscowosci_df.empty:
         raise HTTPException(status_code=404, detail=f"Nie znaleziono miejscowości dla kodu pocztowego: {postal_code}")
@@ -591,25 +1963,25 @@ async def lookup_postal_code_details(
         raise HTTPException(status_code=500, detail=f"Niekompletne dane w pliku kodów pocztowych dla {target_miejscowosc}. Brakuje: {', '.join(missing_info)}")
 
     # Najpierw znajdź RODZ_GMI dla miejscowości z SIMC (miasto vs wieś)
-    rodz_gmi_hint = get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, target_miejscowosc)
+    rodz_gmi_hint = get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, target_miejscowosc, release)
 
     # Wyszukaj kody TERC z hintem RODZ_GMI
-    terc_woj, terc_pow, terc_gmi_full = get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, target_miejscowosc, rodz_gmi_hint)
+    terc_woj, terc_pow, terc_gmi_full = get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, target_miejscowosc, rodz_gmi_hint, release)
 
     # Wyszukaj kod SIMC (wymaga pełnego TERC gminy)
     sym_code, simc_nazwa_oficjalna = None, None
     if terc_gmi_full:
-        sym_code, simc_nazwa_oficjalna = get_simc_code(terc_gmi_full, target_miejscowosc, gmi_nazwa)
+        sym_code, simc_nazwa_oficjalna = get_simc_code(terc_gmi_full, target_miejscowosc, gmi_nazwa, release)
     else:
-        logger.warning(f"Nie można wyszukać SIMC, ponieważ nie udało się ustalić pełnego kodu TERC gminy dla {target_miejscowosc}.")
+        log_event(logging.WARNING, 'details_lookup', "Nie można wyszukać SIMC, ponieważ nie udało się ustalić pełnego kodu TERC gminy dla %s.", target_miejscowosc, postal_code=postal_code)
 
 
     # Wyszukaj dane ULIC (wymaga pełnego TERC gminy i kodu SIMC)
     ulic_df = pd.DataFrame()
     if terc_gmi_full and sym_code:
-        ulic_df = get_ulic_data(terc_gmi_full, sym_code)
+        ulic_df = get_ulic_data(terc_gmi_full, sym_code, release)
     else:
-         logger.warning(f"Nie można wyszukać ULIC dla {target_miejscowosc}, brak TERC gminy ({terc_gmi_full}) lub SIMC ({sym_code}).")
+         log_event(logging.WARNING, 'details_lookup', "Nie można wyszukać ULIC dla %s, brak TERC gminy (%s) lub SIMC (%s).", target_miejscowosc, terc_gmi_full, sym_code, postal_code=postal_code)
 
 
     # W przypadku problemu z konwersją DataFrame na słowniki dla Pydantic, dodaj dodatkową obróbkę
@@ -654,17 +2026,50 @@ async def lookup_postal_code_details(
     response_model=TerytCodesResponse, 
     dependencies=[Depends(verify_token)]
 )
+@timed_endpoint
 async def lookup_address_teryt_codes(
     postal_code: str = Query(..., description="Kod pocztowy (np. '55-011')", pattern=r"^\d{2}-\d{3}$"),
     locality: str = Query(..., description="Nazwa miejscowości", min_length=1),
-    street_name: Optional[str] = Query(None, description="Nazwa ulicy (opcjonalnie, jeśli miejscowość nie ma ulic)", min_length=1)
+    street_name: Optional[str] = Query(None, description="Nazwa ulicy (opcjonalnie, jeśli miejscowość nie ma ulic)", min_length=1),
+    as_of: Optional[date] = Query(None, description="Opcjonalnie: data (RRRR-MM-DD), na którą mają obowiązywać dane TERYT - używa wydania historycznego zamiast bieżącego")
 ):
     """
     Znajduje kody TERC, SIMC i ULIC dla konkretnego adresu zdefiniowanego przez
     kod pocztowy, nazwę miejscowości i (opcjonalnie) nazwę ulicy.
+    Parametr 'as_of' pozwala odpytać stan danych TERC/SIMC/ULIC z historycznego wydania.
     """
     query_params = {"postal_code": postal_code, "locality": locality, "street_name": street_name}
-    logger.info(f"Żądanie wyszukania adresu: {query_params}")
+    log_event(logging.INFO, 'address_request', "Żądanie wyszukania adresu: kod=%s, miejscowość=%s, ulica=%s", postal_code, locality, street_name,
+              postal_code=postal_code, locality=locality, street_name=street_name)
+
+    record_postal_code_access(postal_code.strip())
+    release = resolve_release(as_of) if as_of else None
+    if as_of:
+        query_params.update({"as_of": as_of.isoformat(), "release": release.release_date if release else current_release_date})
+    response = await get_address_teryt_codes_cached(postal_code, locality, street_name, release)
+    # Wynik mógł zostać policzony dla innego zapytania różniącego się tylko zapisem nazw - zwróć własne parametry
+    if isinstance(response, dict):
+        return {**response, "query": query_params}
+    return response.model_copy(update={"query": query_params})
+
+
+async def get_address_teryt_codes_cached(postal_code: str, locality: str, street_name: Optional[str], release=None):
+    """Zwraca odpowiedź endpointu /lookup/address z pamięci podręcznej albo liczy ją (raz dla równoległych zapytań)."""
+    key = ("address", postal_code.strip(), locality.strip().lower(), street_name.strip().lower() if street_name else None,
+           release.release_date if release else None)
+    response = response_cache.get(key)
+    record_cache_result("address", response is not None)
+    if response is None:
+        version = dataset_version
+        response = await single_flight.do(key + (version,), build_address_teryt_codes, postal_code, locality, street_name, release)
+        codes = response if isinstance(response, dict) else response.model_dump()
+        response_cache.put(key, response, version, codes.get("simc"), codes.get("terc_municipality"))
+    return response
+
+
+def build_address_teryt_codes(postal_code: str, locality: str, street_name: Optional[str], release=None):
+    """Wyszukuje kody TERC, SIMC i ULIC dla adresu i buduje odpowiedź endpointu /lookup/address."""
+    query_params = {"postal_code": postal_code, "locality": locality, "street_name": street_name}
 
     # --- Walidacja danych wejściowych i dostępności danych ---
     if kody_pocztowe_data is None: raise HTTPException(status_code=503, detail="Dane kodów pocztowych nie są załadowane.")
@@ -677,7 +2082,7 @@ async def lookup_address_teryt_codes(
     street_name_clean = street_name.strip() if street_name else None
 
     # --- Krok 1: Sprawdź kod pocztowy i miejscowość ---
-    pasujace_kody_df = kody_pocztowe_data[kody_pocztowe_data['PNA'] == postal_code]
+    pasujace_kody_df = get_postal_code_rows(postal_code)
     if pasujace_kody_df.empty:
         raise HTTPException(status_code=404, detail=f"Kod pocztowy nie znaleziony: {postal_code}")
 
@@ -698,17 +2103,17 @@ async def lookup_address_teryt_codes(
 
     # --- Krok 2: Znajdź kody TERC i SIMC ---
     # Najpierw znajdź RODZ_GMI dla miejscowości z SIMC (miasto vs wieś)
-    rodz_gmi_hint = get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, locality_clean)
+    rodz_gmi_hint = get_rodz_gmi_from_simc(woj_nazwa, pow_nazwa, gmi_nazwa, locality_clean, release)
 
     # Wyszukaj kody TERC z hintem RODZ_GMI
-    terc_woj, terc_pow, terc_gmi_full = get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, locality_clean, rodz_gmi_hint)
+    terc_woj, terc_pow, terc_gmi_full = get_terc_codes(woj_nazwa, pow_nazwa, gmi_nazwa, locality_clean, rodz_gmi_hint, release)
     if not terc_gmi_full:
-        logger.warning(f"Nie udało się ustalić pełnego kodu TERC gminy dla {locality_clean}, Gmina {gmi_nazwa}, Powiat {pow_nazwa}")
+        log_event(logging.WARNING, 'address_lookup', "Nie udało się ustalić pełnego kodu TERC gminy dla %s, Gmina %s, Powiat %s", locality_clean, gmi_nazwa, pow_nazwa, postal_code=postal_code)
         raise HTTPException(status_code=404, detail="Nie udało się ustalić pełnego kodu TERC gminy dla podanych danych lokalizacyjnych.")
 
-    sym_code, simc_nazwa_oficjalna = get_simc_code(terc_gmi_full, locality_clean, gmi_nazwa)
+    sym_code, simc_nazwa_oficjalna = get_simc_code(terc_gmi_full, locality_clean, gmi_nazwa, release)
     if not sym_code:
-        logger.warning(f"Nie udało się ustalić kodu SIMC dla {locality_clean} (TERC GMI: {terc_gmi_full})")
+        log_event(logging.WARNING, 'address_lookup', "Nie udało się ustalić kodu SIMC dla %s (TERC GMI: %s)", locality_clean, terc_gmi_full, postal_code=postal_code)
         raise HTTPException(status_code=404, detail=f"Nie udało się ustalić kodu SIMC dla miejscowości '{locality_clean}'.")
 
     # --- Krok 3: Znajdź kod ULIC dla podanej ulicy, jeśli podano ---
@@ -719,18 +2124,12 @@ async def lookup_address_teryt_codes(
 
     if street_name_clean:
         try:
-            woj, pow, gmi, rodz_gmi = terc_gmi_full[:2], terc_gmi_full[2:4], terc_gmi_full[4:6], terc_gmi_full[6]
-            candidate_streets_df = ulic_data_enriched[
-                (ulic_data_enriched['WOJ'] == woj) &
-                (ulic_data_enriched['POW'] == pow) &
-                (ulic_data_enriched['GMI'] == gmi) &
-                (ulic_data_enriched['RODZ_GMI'] == rodz_gmi) &
-                (ulic_data_enriched['SYM'] == sym_code)
-            ]
+            candidate_streets_df = get_candidate_streets(terc_gmi_full, sym_code, release)
             if not candidate_streets_df.empty:
-                matching_street_df = candidate_streets_df[
-                    candidate_streets_df['NAZWA_ULICY_FULL'].str.strip().str.lower() == street_name_clean.lower()
-                ]
+                with stage_timer('street_match'):
+                    matching_street_df = candidate_streets_df[
+                        candidate_streets_df['NAZWA_ULICY_FULL'].str.strip().str.lower() == street_name_clean.lower()
+                    ]
                 if len(matching_street_df) == 1:
                     ulic_code = matching_street_df['SYM_UL'].iloc[0]
                     # Combine CECHA, NAZWA_2, and NAZWA_1 for street_name_found
@@ -744,12 +2143,14 @@ async def lookup_address_teryt_codes(
                     else:
                         street_name_found = f"{cecha} {nazwa_1}".strip()
                     
-                    logger.info(f"Znaleziono unikalny ULIC {ulic_code} dla ulicy '{street_name_clean}' w SIMC {sym_code}")
-                    logger.info(f"Składniki nazwy ulicy: CECHA='{cecha}', NAZWA_2='{nazwa_2}', NAZWA_1='{nazwa_1}', WYNIK='{street_name_found}'")
+                    log_event(logging.INFO, 'street_match', "Znaleziono unikalny ULIC %s dla ulicy '%s' w SIMC %s", ulic_code, street_name_clean, sym_code, simc=sym_code, ulic=ulic_code)
+                    log_event(logging.DEBUG, 'street_match', "Składniki nazwy ulicy: CECHA='%s', NAZWA_2='%s', NAZWA_1='%s', WYNIK='%s'", cecha, nazwa_2, nazwa_1, street_name_found)
                 elif len(matching_street_df) > 1:
                     ulic_codes_found = matching_street_df['SYM_UL'].tolist()
-                    message = f"Znaleziono wiele wpisów dla ulicy '{street_name}'. Dane mogą być niespójne. Znalezione kody ULIC: {ulic_codes_found}"
-                    logger.warning(message)
+                    # Oficjalna nazwa zamiast danych wejściowych - odpowiedź jest współdzielona przez zapytania różniące się zapisem ulicy
+                    official_name = matching_street_df['NAZWA_ULICY_FULL'].iloc[0].strip()
+                    message = f"Znaleziono wiele wpisów dla ulicy '{official_name}'. Dane mogą być niespójne. Znalezione kody ULIC: {ulic_codes_found}"
+                    log_event(logging.WARNING, 'street_match', "%s", message, simc=sym_code)
                     ulic_code = ulic_codes_found[0]
                     # Combine CECHA, NAZWA_2, and NAZWA_1 for the first match
                     first_match = matching_street_df.iloc[0]
@@ -762,10 +2163,10 @@ async def lookup_address_teryt_codes(
                     else:
                         street_name_found = f"{cecha} {nazwa_1}".strip()
                 else:
-                    logger.warning(f"Ulica '{street_name_clean}' nie znaleziona w SIMC {sym_code} (TERC GMI: {terc_gmi_full})")
+                    log_event(logging.WARNING, 'street_match', "Ulica '%s' nie znaleziona w SIMC %s (TERC GMI: %s)", street_name_clean, sym_code, terc_gmi_full, simc=sym_code)
                     raise HTTPException(status_code=404, detail=f"Ulica '{street_name}' nie znaleziona w miejscowości '{locality}' (SIMC: {sym_code}).")
             else:
-                logger.warning(f"Brak jakichkolwiek ulic w danych ULIC dla SIMC {sym_code} (TERC GMI: {terc_gmi_full}).")
+                log_event(logging.WARNING, 'street_match', "Brak jakichkolwiek ulic w danych ULIC dla SIMC %s (TERC GMI: %s).", sym_code, terc_gmi_full, simc=sym_code)
                 raise HTTPException(status_code=404, detail=f"Brak danych o ulicach dla miejscowości '{locality}' (SIMC: {sym_code}).")
         except HTTPException as http_exc:
             raise http_exc
@@ -774,14 +2175,7 @@ async def lookup_address_teryt_codes(
             raise HTTPException(status_code=500, detail="Błąd wewnętrzny serwera podczas wyszukiwania ulicy.")
     else:
         # Jeśli nie podano ulicy, sprawdź czy są dostępne ulice dla tej miejscowości i podpowiedz je
-        woj, pow, gmi, rodz_gmi = terc_gmi_full[:2], terc_gmi_full[2:4], terc_gmi_full[4:6], terc_gmi_full[6]
-        candidate_streets_df = ulic_data_enriched[
-            (ulic_data_enriched['WOJ'] == woj) &
-            (ulic_data_enriched['POW'] == pow) &
-            (ulic_data_enriched['GMI'] == gmi) &
-            (ulic_data_enriched['RODZ_GMI'] == rodz_gmi) &
-            (ulic_data_enriched['SYM'] == sym_code)
-        ]
+        candidate_streets_df = get_candidate_streets(terc_gmi_full, sym_code, release)
         if not candidate_streets_df.empty:
             street_suggestions = sorted(candidate_streets_df['NAZWA_ULICY_FULL'].dropna().unique())
             if street_suggestions:
@@ -0,0 +1,34 @@
+"""Wspólne fikstury testów: małe, powtarzalne dane TERYT z benchmarks/generate_data.py."""
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('WARMUP_ENABLED', 'false')
+
+import main  # noqa: E402
+from benchmarks.generate_data import generate  # noqa: E402
+
+SCALE = 0.2
+SEED = 7
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    """Katalog z wygenerowanymi plikami TERC/SIMC/ULIC i kodów pocztowych (raz na sesję)."""
+    path = tmp_path_factory.mktemp('teryt')
+    generate(str(path), scale=SCALE, seed=SEED)
+    return str(path)
+
+
+@pytest.fixture
+def loaded(data_dir, monkeypatch):
+    """Ładuje wygenerowane dane do globalnych tabel modułu main - od nowa dla każdego testu."""
+    monkeypatch.setattr(main, 'DATA_DIR', data_dir)
+    monkeypatch.setattr(main, 'HISTORICAL_RELEASES', [])
+    main.load_data_on_startup()
+    main.load_historical_releases() # Czyści wydania historyczne pozostawione przez poprzednie testy
+    return main
@@ -0,0 +1,173 @@
+"""Testy przyrostowych aktualizacji danych (pliki zmian TERYT, apply_delta)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+
+def delta(rows, operation):
+    return rows.assign(**{main.DELTA_OPERATION_COLUMN: operation})
+
+
+def expected_after(df, delta_df, dataset):
+    """Tabela, jaką dałoby pełne przeładowanie pliku GUS z nałożonymi zmianami."""
+    keys = main.DELTA_KEYS[dataset]
+    touched = pd.MultiIndex.from_frame(delta_df[keys].fillna(''))
+    kept = df[~pd.MultiIndex.from_frame(df[keys].fillna('')).isin(touched)]
+    added = delta_df[delta_df[main.DELTA_OPERATION_COLUMN] != 'U'].drop(columns=main.DELTA_OPERATION_COLUMN)
+    return (pd.concat([kept, added], ignore_index=True)
+            .sort_values(main.GUS_ROW_ORDER[dataset], kind='stable', na_position='first', ignore_index=True))
+
+
+def assert_streets_match_fresh_load(ulic_df, simc_df):
+    """Porównuje wzbogacone ulice i indeks ulic z wynikiem enrich_ulic_data + build_ulic_index od zera."""
+    fresh = main.enrich_ulic_data(ulic_df, simc_df)
+    fresh_index = main.build_ulic_index(fresh)
+    assert main.ulic_index.keys() == fresh_index.keys()
+    for locality_key, labels in fresh_index.items():
+        actual = main.ulic_data_enriched.loc[main.ulic_index[locality_key], fresh.columns].reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, fresh.loc[labels].reset_index(drop=True), obj=str(locality_key))
+
+
+def assert_name_index_matches_fresh_build(dataset):
+    fresh = main.build_name_indexes(main.terc_data, main.simc_data)[dataset]
+    index = main.name_indexes[dataset]
+    assert index.df is {'TERC': main.terc_data, 'SIMC': main.simc_data}[dataset]
+    assert list(index.names) == list(fresh.names)
+    assert list(index.positions) == list(fresh.positions)
+
+
+def locality_with_streets(min_streets=3, skip=0):
+    counts = main.ulic_data['SYM'].value_counts()
+    return counts[counts >= min_streets].index[skip]
+
+
+def terc_of(sym_code):
+    row = main.simc_data[main.simc_data['SYM'] == sym_code].iloc[0]
+    return f"{row.WOJ}{row.POW}{row.GMI}{row.RODZ_GMI}"
+
+
+def test_ulic_delta_matches_fresh_load(loaded):
+    sym_code = locality_with_streets()
+    streets = main.ulic_data[main.ulic_data['SYM'] == sym_code]
+    delta_df = pd.concat([
+        delta(streets.iloc[[0]].assign(NAZWA_1='Zmieniona'), 'M'),
+        delta(streets.iloc[[1]], 'U'),
+        delta(streets.iloc[[2]].assign(SYM_UL='99999', NAZWA_1='Nowa'), 'D'),
+    ])
+    expected_ulic = expected_after(main.ulic_data, delta_df, 'ULIC')
+    index_before = dict(main.ulic_index)
+
+    summary = main.apply_delta('ULIC', delta_df)
+
+    assert (summary['added'], summary['modified'], summary['deleted']) == (1, 1, 1)
+    assert_streets_match_fresh_load(expected_ulic, main.simc_data)
+    # Etykiety wierszy niezmienionych miejscowości pozostają ważne
+    for locality_key, labels in index_before.items():
+        if locality_key[-1] != sym_code:
+            assert np.array_equal(main.ulic_index[locality_key], labels)
+
+
+def test_simc_delta_matches_fresh_load(loaded):
+    renamed = main.simc_data[main.simc_data['SYM'] == locality_with_streets()]
+    removed = main.simc_data[main.simc_data['SYM'] == locality_with_streets(skip=1)]
+    added = renamed.assign(SYM='9999999', SYMPOD='9999999', NAZWA='Nowowieś')
+    delta_df = pd.concat([delta(renamed.assign(NAZWA='Zmieniona'), 'M'), delta(removed, 'U'), delta(added, 'D')])
+    expected_simc = expected_after(main.simc_data, delta_df, 'SIMC')
+
+    main.apply_delta('SIMC', delta_df)
+
+    pd.testing.assert_frame_equal(main.simc_data, expected_simc)
+    assert_name_index_matches_fresh_build('SIMC')
+    assert_streets_match_fresh_load(main.ulic_data, expected_simc)
+    renamed_streets = main.get_candidate_streets(terc_of(renamed['SYM'].iloc[0]), renamed['SYM'].iloc[0])
+    assert set(renamed_streets['NAZWA_MIEJSCOWOSCI']) == {'Zmieniona'}
+
+
+def test_modified_rows_are_written_in_place(loaded):
+    sym_code = locality_with_streets()
+    street = main.ulic_data[main.ulic_data['SYM'] == sym_code].iloc[[0]]
+    tables = (main.ulic_data, main.ulic_data_enriched, main.simc_data)
+    index_before = dict(main.ulic_index)
+
+    main.apply_delta('ULIC', delta(street.assign(NAZWA_1='Zmieniona'), 'M'))
+    main.apply_delta('SIMC', delta(main.simc_data[main.simc_data['SYM'] == sym_code].assign(NAZWA='Inna'), 'M'))
+
+    # Zmiany M bez zmiany klucza nie przebudowują tabel ani indeksu ulic
+    assert all(a is b for a, b in zip((main.ulic_data, main.ulic_data_enriched, main.simc_data), tables))
+    assert main.ulic_index.keys() == index_before.keys()
+    assert main.ulic_data_enriched.loc[street.index[0], 'NAZWA_1'] == 'Zmieniona'
+    assert set(main.get_candidate_streets(terc_of(sym_code), sym_code)['NAZWA_MIEJSCOWOSCI']) == {'Inna'}
+    assert_name_index_matches_fresh_build('SIMC')
+    assert main.get_simc_code(terc_of(sym_code), ' inna ', 'x') == (sym_code, 'Inna')
+
+
+def test_terc_delta_keeps_gus_row_order(loaded):
+    # Gmina miejsko-wiejska: RODZ 3/4/5 mają tę samą nazwę, a wyszukiwanie bierze pierwszy pasujący wiersz
+    terc = main.terc_data
+    town = terc[terc['RODZ'] == '4'].iloc[[0]]
+    rural = terc[(terc['WOJ'] == town['WOJ'].iloc[0]) & (terc['POW'] == town['POW'].iloc[0])
+                 & (terc['GMI'] == town['GMI'].iloc[0]) & (terc['RODZ'] == '5')]
+    delta_df = pd.concat([
+        delta(town.assign(NAZWA_DOD='miasto (zmienione)'), 'M'),
+        delta(rural, 'U'),
+        delta(town.assign(GMI='99', RODZ='1', NAZWA='Nowa gmina'), 'D'),
+    ])
+    expected_terc = expected_after(terc, delta_df, 'TERC')
+
+    main.apply_delta('TERC', delta_df)
+
+    pd.testing.assert_frame_equal(main.terc_data, expected_terc)
+    assert_name_index_matches_fresh_build('TERC')
+
+
+@pytest.mark.parametrize('dataset', ['ULIC', 'SIMC', 'TERC'])
+def test_delta_invalidates_only_touched_cache_entries(loaded, dataset):
+    touched_sym, other_sym = locality_with_streets(), locality_with_streets(skip=1)
+    touched_terc, other_terc = terc_of(touched_sym), terc_of(other_sym)
+    assert touched_terc[:6] != other_terc[:6], "Miejscowości testowe muszą leżeć w różnych gminach"
+    cache = main.response_cache
+    version = main.dataset_version
+    cache.put(('touched',), 'touched', version, touched_sym, touched_terc)
+    cache.put(('same_municipality',), 'same_municipality', version, '8888888', touched_terc)
+    cache.put(('other',), 'other', version, other_sym, other_terc)
+    cache.put(('unresolved',), 'unresolved', version, None, None)
+
+    if dataset == 'ULIC':
+        rows = main.ulic_data[main.ulic_data['SYM'] == touched_sym].iloc[[0]]
+    elif dataset == 'SIMC':
+        rows = main.simc_data[main.simc_data['SYM'] == touched_sym]
+    else:
+        terc = main.terc_data
+        rows = terc[(terc['WOJ'] + terc['POW'].fillna('') + terc['GMI'].fillna('') + terc['RODZ'].fillna('')) == touched_terc]
+    main.apply_delta(dataset, delta(rows.assign(NAZWA_1='Zmieniona') if dataset == 'ULIC' else rows.assign(NAZWA='Zmieniona'), 'M'))
+
+    remaining = {key[0] for key in cache._entries}
+    expected = {
+        'ULIC': {'same_municipality', 'other', 'unresolved'},  # tylko odpowiedzi dla zmienionej miejscowości
+        'SIMC': {'other'},  # miejscowość mogła zmienić gminę - także jej gmina i wpisy bez SIMC/TERC
+        'TERC': {'other'},
+    }[dataset]
+    assert remaining == expected
+
+
+def test_delta_rows_without_all_table_columns_are_rejected(loaded):
+    simc_before = main.simc_data
+    row = main.simc_data.iloc[[0]]
+    with pytest.raises(ValueError, match='WOJ'):
+        main.apply_delta('SIMC', delta(row[['SYM', 'NAZWA']].assign(NAZWA='Zmieniona'), 'M'))
+    with pytest.raises(ValueError, match='typów kolumn'):
+        main.apply_delta('SIMC', delta(row.assign(RM=np.nan), 'M'))
+    assert main.simc_data is simc_before
+    # Usunięcie wymaga tylko kolumn klucza
+    main.apply_delta('SIMC', delta(row[['SYM']], 'U'))
+    assert row['SYM'].iloc[0] not in set(main.simc_data['SYM'])
+    assert main.simc_data['RM'].dtype == simc_before['RM'].dtype
+
+
+def test_delta_file_with_blank_operation_is_rejected(loaded, tmp_path):
+    path = tmp_path / 'SIMC_zmiany.csv'
+    delta(main.simc_data.iloc[:2], ['M', '']).to_csv(path, sep=';', index=False)
+    with pytest.raises(ValueError, match='Nieznane typy korekty'):
+        main.read_delta_file(str(path), 'SIMC')
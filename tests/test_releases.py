@@ -0,0 +1,155 @@
+"""Testy zapytań o historyczne wydania TERYT (parametr as_of)."""
+import os
+import shutil
+from datetime import date
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+OLD_RELEASE = '2024-01-01'
+MIDDLE_RELEASE = '2025-01-01'
+CURRENT_RELEASE = '2025-07-30'  # Data w nazwach plików z benchmarks/generate_data.py
+
+
+def write_release(df, pattern, release_date, directory):
+    df.assign(STAN_NA=release_date).to_csv(os.path.join(directory, pattern.format(date=release_date)), sep=';', index=False)
+
+
+@pytest.fixture
+def releases(data_dir, tmp_path, monkeypatch):
+    """Bieżące dane i dwa wydania historyczne.
+
+    W najstarszym wydaniu jedna miejscowość miała inną nazwę, a w środkowym brakowało jednej
+    z jej ulic (ulica wróciła w bieżącym wydaniu).
+    """
+    for file_name in os.listdir(data_dir):
+        shutil.copy(os.path.join(data_dir, file_name), tmp_path)
+    terc = main.read_teryt_csv(os.path.join(data_dir, main.TERC_FILENAME))
+    simc = main.read_teryt_csv(os.path.join(data_dir, main.SIMC_FILENAME))
+    ulic = main.read_teryt_csv(os.path.join(data_dir, main.ULIC_FILENAME))
+    sym_code = ulic['SYM'].value_counts().index[0]
+    streets = ulic[ulic['SYM'] == sym_code]
+    street = streets.iloc[0]
+
+    old_simc = simc.copy()
+    old_simc.loc[old_simc['SYM'] == sym_code, 'NAZWA'] = 'Dawna Nazwa'
+    for release_date, simc_df, ulic_df in [(OLD_RELEASE, old_simc, ulic), (MIDDLE_RELEASE, simc, ulic.drop(index=street.name))]:
+        write_release(terc, main.TERC_RELEASE_PATTERN, release_date, tmp_path)
+        write_release(simc_df, main.SIMC_RELEASE_PATTERN, release_date, tmp_path)
+        write_release(ulic_df, main.ULIC_RELEASE_PATTERN, release_date, tmp_path)
+
+    monkeypatch.setattr(main, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(main, 'HISTORICAL_RELEASES', [OLD_RELEASE, MIDDLE_RELEASE])
+    main.load_data_on_startup()
+    main.load_historical_releases()
+    locality = simc[simc['SYM'] == sym_code].iloc[0]
+    return SimpleNamespace(
+        sym_code=sym_code,
+        name=locality['NAZWA'],
+        street_code=street['SYM_UL'],
+        street_count=len(streets),
+        locality_key=(locality['WOJ'], locality['POW'], locality['GMI'], locality['RODZ_GMI'], sym_code),
+    )
+
+
+def locality_name(view, sym_code):
+    return view.simc.loc[view.simc['SYM'] == sym_code, 'NAZWA'].iloc[0]
+
+
+def street_codes(view, locality_key):
+    return set(view.get_streets(locality_key)['SYM_UL'])
+
+
+def test_as_of_before_oldest_release_is_404(releases):
+    with pytest.raises(HTTPException) as exc_info:
+        main.resolve_release(date(2023, 12, 31))
+    assert exc_info.value.status_code == 404
+
+
+def test_as_of_between_releases_uses_older_release(releases):
+    old_view = main.resolve_release(date(2024, 6, 30))
+    assert old_view.release_date == OLD_RELEASE
+    assert locality_name(old_view, releases.sym_code) == 'Dawna Nazwa'
+    assert set(old_view.simc['STAN_NA']) == {OLD_RELEASE}
+
+    middle_view = main.resolve_release(date.fromisoformat(MIDDLE_RELEASE))
+    assert middle_view.release_date == MIDDLE_RELEASE
+    assert locality_name(middle_view, releases.sym_code) == releases.name
+
+
+@pytest.mark.parametrize('as_of', [date.fromisoformat(CURRENT_RELEASE), date(2030, 1, 1)])
+def test_as_of_at_or_after_current_release_uses_current_data(releases, as_of):
+    assert main.resolve_release(as_of) is None
+
+
+def test_as_of_endpoint_reports_release(releases):
+    client = TestClient(main.app)  # Bez lifespan - dane są już załadowane przez fiksturę
+    headers = {"Authorization": f"Bearer {main.API_TOKEN}"}
+    postal_code = main.kody_pocztowe_data['PNA'].iloc[0]
+    for as_of, status, release in [('2023-12-31', 404, None), ('2025-03-01', 200, MIDDLE_RELEASE), ('2030-01-01', 200, CURRENT_RELEASE)]:
+        response = client.get(f"/postal_codes/{postal_code}/localities", headers=headers)
+        assert response.status_code == 200
+        locality = response.json()['localities'][0]
+        response = client.get("/lookup/address", params={"postal_code": postal_code, "locality": locality, "as_of": as_of}, headers=headers)
+        assert response.status_code == status, as_of
+        if release:
+            assert response.json()['query']['release'] == release
+
+
+def test_row_removed_and_restored(releases):
+    old_view, middle_view = main.get_release_view(0, main.terc_simc_version), main.get_release_view(1, main.terc_simc_version)
+    assert releases.street_code in street_codes(old_view, releases.locality_key)
+    assert releases.street_code not in street_codes(middle_view, releases.locality_key)
+    current_streets = main.get_candidate_streets(''.join(releases.locality_key[:4]), releases.sym_code)
+    assert releases.street_code in set(current_streets['SYM_UL'])
+
+
+def test_current_release_rows_are_not_stored_again(releases):
+    # Tabele wersji przechowują tylko wiersze różniące się od bieżących danych: ulice miejscowości
+    # o dawnej nazwie (wzbogacone inną nazwą miejscowości) i wiersz SIMC z tą nazwą
+    assert len(main.terc_history) == 0
+    assert len(main.simc_history) == 1
+    assert len(main.ulic_history) == releases.street_count
+    stats = TestClient(main.app).get('/stats/releases').json()
+    assert stats['rows_without_deduplication']['ULIC'] == 3 * len(main.ulic_data_enriched) - 1
+    assert stats['stored_rows']['ULIC'] == len(main.ulic_data_enriched) + releases.street_count
+
+
+def test_historical_releases_survive_deltas_on_current_data(releases):
+    old_view = main.get_release_view(0, main.terc_simc_version)
+    old_streets = old_view.get_streets(releases.locality_key).reset_index(drop=True)
+    middle_terc = main.get_release_view(1, main.terc_simc_version).terc.reset_index(drop=True)
+    simc_row = main.simc_data[main.simc_data['SYM'] == releases.sym_code]
+    street_row = main.ulic_data[(main.ulic_data['SYM'] == releases.sym_code) & (main.ulic_data['SYM_UL'] == releases.street_code)]
+    terc_row = main.terc_data[main.terc_data['RODZ'] == '4'].iloc[[0]]
+
+    main.apply_delta('ULIC', street_row.assign(**{main.DELTA_OPERATION_COLUMN: 'U'}))
+    main.apply_delta('SIMC', simc_row.assign(NAZWA='Nowa Nazwa', **{main.DELTA_OPERATION_COLUMN: 'M'}))
+    main.apply_delta('TERC', terc_row.assign(NAZWA='Nowa Gmina', **{main.DELTA_OPERATION_COLUMN: 'M'}))
+
+    middle_view = main.get_release_view(1, main.terc_simc_version)
+    assert locality_name(middle_view, releases.sym_code) == releases.name
+    pd.testing.assert_frame_equal(middle_view.terc.reset_index(drop=True), middle_terc)
+    pd.testing.assert_frame_equal(main.get_release_view(0, main.terc_simc_version).get_streets(releases.locality_key).reset_index(drop=True), old_streets)
+    assert releases.street_code not in set(main.get_candidate_streets(''.join(releases.locality_key[:4]), releases.sym_code)['SYM_UL'])
+
+
+def test_release_views_are_rebuilt_only_after_terc_or_simc_deltas(releases):
+    assert main.get_release_view.cache_parameters()['maxsize'] == 2  # Domyślnie po jednym widoku na wydanie
+    old_view, middle_view = main.resolve_release(date.fromisoformat(OLD_RELEASE)), main.resolve_release(date.fromisoformat(MIDDLE_RELEASE))
+    street_row = main.ulic_data[main.ulic_data['SYM'] == releases.sym_code].iloc[[0]]
+    simc_row = main.simc_data[main.simc_data['SYM'] == releases.sym_code]
+
+    main.apply_delta('ULIC', street_row.assign(NAZWA_1='Zmieniona', **{main.DELTA_OPERATION_COLUMN: 'M'}))
+    assert main.resolve_release(date.fromisoformat(OLD_RELEASE)) is old_view
+    assert main.resolve_release(date.fromisoformat(MIDDLE_RELEASE)) is middle_view
+
+    main.apply_delta('SIMC', simc_row.assign(NAZWA='Nowa Nazwa', **{main.DELTA_OPERATION_COLUMN: 'M'}))
+    rebuilt_view = main.resolve_release(date.fromisoformat(MIDDLE_RELEASE))
+    assert rebuilt_view is not middle_view
+    assert locality_name(rebuilt_view, releases.sym_code) == releases.name
@@ -0,0 +1,101 @@
+"""Testy łączenia równoległych, identycznych obliczeń (SingleFlight)."""
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+class Lookup:
+    """Obliczenie blokowane do czasu release.set(), zapisujące argumenty wywołań."""
+
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, name):
+        self.calls.append(name)
+        assert self.release.wait(5)
+        if self.fail:
+            raise HTTPException(status_code=404, detail=f"Nie znaleziono: {name}")
+        return f"wynik {name.lower()}"
+
+
+def run_concurrently(flight, lookup, names):
+    """Uruchamia zapytania o ten sam klucz tak, by wszystkie trafiły na trwające obliczenie pierwszego z nich."""
+    async def run():
+        tasks = [asyncio.ensure_future(flight.do('klucz', lookup, name)) for name in names]
+        await asyncio.sleep(0)  # Wszystkie zapytania czekają już na obliczenie
+        lookup.release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_identical_requests_share_one_computation():
+    flight, lookup = main.SingleFlight(), Lookup()
+
+    results = run_concurrently(flight, lookup, ['Kraków'] * 3)
+
+    assert results == ['wynik kraków'] * 3
+    assert lookup.calls == ['Kraków']
+    assert flight.stats() == {"computations": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_error_is_shared_for_identical_input():
+    flight, lookup = main.SingleFlight(), Lookup(fail=True)
+
+    results = run_concurrently(flight, lookup, ['Kraków'] * 2)
+
+    assert [error.detail for error in results] == ["Nie znaleziono: Kraków"] * 2
+    assert lookup.calls == ['Kraków']
+    assert flight.stats() == {"computations": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_error_is_recomputed_for_different_input_with_same_key():
+    # Klucz jest znormalizowany, a błąd powtarza dane wejściowe - każde zapytanie dostaje własny komunikat
+    flight, lookup = main.SingleFlight(), Lookup(fail=True)
+
+    results = run_concurrently(flight, lookup, ['Kraków', 'KRAKÓW'])
+
+    assert [error.detail for error in results] == ["Nie znaleziono: Kraków", "Nie znaleziono: KRAKÓW"]
+    assert lookup.calls == ['Kraków', 'KRAKÓW']
+    assert flight.stats() == {"computations": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_result_is_shared_for_different_input_with_same_key():
+    flight, lookup = main.SingleFlight(), Lookup()
+
+    assert run_concurrently(flight, lookup, ['Kraków', 'KRAKÓW']) == ['wynik kraków'] * 2
+    assert flight.stats() == {"computations": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_cancelled_leader_does_not_cancel_computation():
+    flight, lookup = main.SingleFlight(), Lookup()
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do('klucz', lookup, 'Kraków'))
+        follower = asyncio.ensure_future(flight.do('klucz', lookup, 'Kraków'))
+        await asyncio.sleep(0)
+        leader.cancel()
+        lookup.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == 'wynik kraków'
+    assert lookup.calls == ['Kraków']
+    assert flight.stats() == {"computations": 1, "coalesced": 1, "in_flight": 0}
+
+
+def test_finished_computation_is_not_reused():
+    flight, lookup = main.SingleFlight(), Lookup()
+    lookup.release.set()
+
+    for _ in range(2):
+        assert asyncio.run(flight.do('klucz', lookup, 'Kraków')) == 'wynik kraków'
+
+    assert lookup.calls == ['Kraków', 'Kraków']
+    assert flight.stats() == {"computations": 2, "coalesced": 0, "in_flight": 0}